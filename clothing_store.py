@@ -107,8 +107,9 @@ class ClothingCard(QFrame):
 class ClothingView(QWidget):
     request_furniture_view = pyqtSignal()
     request_home_view = pyqtSignal()
-    checkout_completed = pyqtSignal(list, dict) 
+    checkout_completed = pyqtSignal(object, dict) 
     money_changed = pyqtSignal(int)
+    purchase_completed = pyqtSignal(str, str, int)
 
     def __init__(self, clothes_data, styles=default_theme): 
         '''Initializes the main clothing shop view
@@ -207,13 +208,14 @@ class ClothingView(QWidget):
             self.clothes_data.money -= item_price
             
             if item_name not in self.clothes_data.inventory_clothes:
-                self.clothes_data.inventory_clothes.append(item_name)
+                self.clothes_data.inventory_clothes.add(item_name)
             
             # DYNAMIC SNAPSHOT UPDATE
             cat = self.get_category_of(item_name)
             if cat:
                 self.original_outfit[cat] = item_name
 
+            self.purchase_completed.emit(item_name, 'clothe', item_price)
             self.money_changed.emit(self.clothes_data.money)
             self.refresh_page()
             return True
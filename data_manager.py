@@ -1,11 +1,706 @@
 import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from migrations import run_migrations
+from db_profiler import profiler, ProfiledConnection
+
+# Tasks without a deadline sort after every due date, shared by the paging and due range queries and idx_tasks_due
+NO_DEADLINE = 253402300799
+TASK_DUE_KEY = f"COALESCE(due_at, {NO_DEADLINE})"
+
+# Task panel groups in panel order, unfinished tasks by how soon they are due and finished ones last
+URGENCY_GROUPS = ('Overdue', 'Due today', 'Due this week', 'Later', 'No deadline', 'Done')
+
+def urgency_bounds(now=None):
+    '''Returns the epoch times splitting unfinished tasks into urgency groups: now, the end of today and the end of this week
+
+    Input: int or None
+    Output: tuple'''
+    now = int(time.time()) if now is None else now
+    midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = midnight + timedelta(days=1)
+    end_of_week = midnight + timedelta(days=7 - midnight.weekday())
+    return (now, int(end_of_day.timestamp()), int(end_of_week.timestamp()))
+
+def urgency_group(task, bounds):
+    '''Returns the index in URGENCY_GROUPS of the group a task falls in
+
+    Input: object, tuple
+    Output: int'''
+    if task.status != 0:
+        return 5
+    if task.due_at is None:
+        return 4
+    now, end_of_day, end_of_week = bounds
+    if task.due_at < now:
+        return 0
+    if task.due_at < end_of_day:
+        return 1
+    if task.due_at < end_of_week:
+        return 2
+    return 3
+
+### Typed containers for rows loaded from the database ###
+class UserTask():
+    def __init__(self, uuid, taskid, name, date_due, time_due, deadline, status, subdivisions, reward, subtasks, grant_status, due_at=None):
+        self.uuid = uuid
+        self.taskid = taskid
+        self.name = name
+        self.status = status
+        self.subdivisions = subdivisions
+        self.deadline = deadline
+        self.time_due = time_due
+        self.date_due = date_due
+        self.reward = reward
+        self.grant_status = grant_status
+        self.subtasks = subtasks
+        self.due_at = due_at
+
+    def page_key(self):
+        '''Returns the task's position in the task panel order, passed back as the after key of the next page
+
+        Input: None
+        Output: tuple'''
+        return (self.status, NO_DEADLINE if self.due_at is None else self.due_at, self.taskid)
+
+class Inventory(Counter):
+    '''Multiset of owned item names mapped to the quantity column, counts and updates are O(1)'''
+    def count(self, item):
+        '''Returns how many of an item are owned
+
+        Input: str
+        Output: int'''
+        return self[item]
+
+    def add(self, item, quantity=1):
+        '''Adds units of an item
+
+        Input: str, int
+        Output: None'''
+        self[item] += quantity
+
+    def discard(self, item, quantity=1):
+        '''Removes units of an item, dropping it once none are left so membership tests stay true to ownership
+
+        Input: str, int
+        Output: None'''
+        remaining = self[item] - quantity
+        if remaining > 0:
+            self[item] = remaining
+        else:
+            self.pop(item, None)
+
+    def rows(self):
+        '''Returns (item_name, quantity) pairs ready to write to the inventory table
+
+        Input: None
+        Output: list'''
+        return [(item, quantity) for item, quantity in self.items() if quantity > 0]
+
+class UserSnapshot():
+    def __init__(self, uuid, money, inventory_furniture, placed_furniture, inventory_clothes, equipped_clothes, tasks):
+        '''Holds everything loaded for a user at login, tasks only hold the first page of the task panel
+
+        Input: int, int, object, list, object, dict, list
+        Output: None'''
+        self.uuid = uuid
+        self.money = money
+        self.inventory_furniture = inventory_furniture
+        self.placed_furniture = placed_furniture
+        self.inventory_clothes = inventory_clothes
+        self.equipped_clothes = equipped_clothes
+        self.tasks = tasks
+
+### Creating connection manager to keep configured connections alive between queries ###
+class ConnectionManager():
+    def __init__(self, busy_timeout=5000, cached_statements=256):
+        '''Keeps one long-lived connection per thread and database path
+
+        Input: int, int
+        Output: None'''
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._connections = {}
+        self._write_queues = {}
+        self._lock = threading.Lock()
+        self.on_write_error = None
+
+    def get(self, db_path):
+        '''Returns the calling thread's connection to the database, opening it on first use
+
+        Input: str
+        Output: object'''
+        key = (threading.get_ident(), db_path)
+        conn = self._connections.get(key)
+        if conn is None:
+            conn = self._open(db_path)
+            with self._lock:
+                self._connections[key] = conn
+        return conn
+
+    def release(self, db_path):
+        '''Closes the calling thread's connection to the database, for short-lived threads finishing their work
+
+        Input: str
+        Output: None'''
+        with self._lock:
+            conn = self._connections.pop((threading.get_ident(), db_path), None)
+        if conn is not None:
+            conn.close()
+
+    def _open(self, db_path):
+        '''Opens a connection and applies the pragmas shared by every connection
+
+        Input: str
+        Output: object'''
+        # Connections stay on their own thread, the flag only lets close_all run from the GUI thread.
+        # Profiling swaps in an instrumented connection class, otherwise the plain one is used and costs nothing extra
+        conn = sqlite3.connect(
+            db_path,
+            timeout=self.busy_timeout / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=ProfiledConnection if profiler.enabled else sqlite3.Connection
+        )
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def write_queue(self, db_path):
+        '''Returns the write-behind queue of the database, creating it on first use
+
+        Input: str
+        Output: object'''
+        with self._lock:
+            queue = self._write_queues.get(db_path)
+            if queue is None:
+                queue = WriteBehindQueue(self, db_path)
+                self._write_queues[db_path] = queue
+            return queue
+
+    def flush_writes(self, db_path):
+        '''Waits until every write queued for the database so far is on disk
+
+        Input: str
+        Output: None'''
+        queue = self._write_queues.get(db_path)
+        if queue is not None:
+            queue.flush()
+
+    def report_write_error(self, key, error):
+        '''Passes a failed queued write to the registered error handler
+
+        Input: tuple, Exception
+        Output: None'''
+        handler = self.on_write_error
+        if handler is not None:
+            handler(key, error)
+
+    def close_all(self):
+        '''Flushes and stops the write queues, then closes every open connection, used as the shutdown hook
+
+        Input: None
+        Output: None'''
+        with self._lock:
+            queues = list(self._write_queues.values())
+            self._write_queues.clear()
+
+        for queue in queues:
+            queue.close()
+
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+### Creating write-behind queue so writes run on a dedicated thread instead of the GUI thread ###
+class WriteBehindQueue():
+    def __init__(self, manager, db_path, flush_interval=0.25):
+        '''Collects write jobs and commits them in batches from a writer thread
+
+        Input: object, str, float
+        Output: None'''
+        self.manager = manager
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closing = False
+        self._thread = None
+
+    def submit(self, key, job, on_done=None, on_rollback=None):
+        '''Queues a job that receives a cursor, a job with the same key as a pending one replaces it and moves to the back
+        so it still runs after everything submitted before it. on_done gets the job's result after commit and on_rollback runs whenever its transaction is undone,
+        both are called from the writer thread
+
+        Input: tuple or None, function, function, function
+        Output: None'''
+        with self._cond:
+            self._submitted += 1
+            if key is None:
+                key = ('job', self._submitted)
+            self._pending.pop(key, None)
+            self._pending[key] = (self._submitted, job, on_done, on_rollback)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        '''Blocks until every job submitted before the call has been written
+
+        Input: float or None
+        Output: bool'''
+        if threading.current_thread() is self._thread:
+            return True
+
+        with self._cond:
+            target = self._submitted
+            if self._written >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        '''Writes everything still queued and stops the writer thread
+
+        Input: None
+        Output: None'''
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        '''Writer thread loop, waits out the flush interval so repeated writes can coalesce
+
+        Input: None
+        Output: None'''
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                deadline = time.monotonic() + self.flush_interval
+                while not self._flush_requested and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = list(self._pending.items())
+                self._pending.clear()
+                self._flush_requested = False
+
+            self._write_batch(batch)
+
+            with self._cond:
+                self._written = max(self._written, max(entry[0] for _, entry in batch))
+                self._cond.notify_all()
+
+    def _write_batch(self, batch):
+        '''Commits a batch in one transaction, falling back to one transaction per job when it fails
+
+        Input: list
+        Output: None'''
+        conn = self.manager.get(self.db_path)
+        try:
+            results = self._execute(conn, batch)
+        except Exception:
+            self._rolled_back(batch)
+            results = []
+            for key, entry in batch:
+                try:
+                    results += self._execute(conn, [(key, entry)])
+                except Exception as e:
+                    self._rolled_back([(key, entry)])
+                    self.manager.report_write_error(key, e)
+
+        for key, on_done, result in results:
+            if on_done is None:
+                continue
+            try:
+                on_done(result)
+            except Exception as e:
+                self.manager.report_write_error(key, e)
+
+    def _execute(self, conn, batch):
+        '''Runs jobs inside a single transaction
+
+        Input: object, list
+        Output: list'''
+        results = []
+        with conn:
+            cursor = conn.cursor()
+            for key, (_, job, on_done, _) in batch:
+                results.append((key, on_done, job(cursor)))
+        return results
+
+    def _rolled_back(self, batch):
+        '''Lets jobs undo in-memory side effects of a rolled back transaction
+
+        Input: list
+        Output: None'''
+        for key, (_, _, _, on_rollback) in batch:
+            if on_rollback is not None:
+                on_rollback()
+
+connection_manager = ConnectionManager()
+
+### Creating read-through cache so unchanged per-user data is not read from disk again ###
+class ReadThroughCache():
+    def __init__(self):
+        '''Caches loaded values by key and counts hits and misses
+
+        Input: None
+        Output: None'''
+        self._entries = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        '''Returns the cached value for key, calling loader to fill it on a miss
+
+        Input: object, function
+        Output: object'''
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+
+        value = loader()
+
+        # An invalidation that arrived while loading means the value may already be stale, so it is not kept
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        '''Stores a value loaded elsewhere, such as the login snapshot
+
+        Input: object, object
+        Output: None'''
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key):
+        '''Drops the cached value for key
+
+        Input: object
+        Output: None'''
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._discard(key)
+
+    def clear(self):
+        '''Drops every cached value
+
+        Input: None
+        Output: None'''
+        with self._lock:
+            for key in list(self._entries):
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._discard(key)
+
+    def stats(self):
+        '''Returns hit and miss counters and the number of cached keys
+
+        Input: None
+        Output: dict'''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _store(self, key, value):
+        self._entries[key] = value
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+
+class TaskCache(ReadThroughCache):
+    '''First task pages keyed by uuid, indexed by taskid so writes that only know a task id can find their owner'''
+    def __init__(self):
+        super().__init__()
+        self._task_owners = {}
+
+    def invalidate_task(self, taskid):
+        '''Drops the cached task list holding the task, ids no cached list holds need nothing dropped
+
+        Input: int
+        Output: None'''
+        uuid = self._task_owners.get(taskid)
+        if uuid is not None:
+            self.invalidate(uuid)
+
+    def note_tasks(self, uuid, tasks):
+        '''Indexes tasks loaded outside the cached list, such as later pages, so writes to them still invalidate their owner
+
+        Input: int, list
+        Output: None'''
+        with self._lock:
+            for task in tasks:
+                self._task_owners[task.taskid] = uuid
+
+    def _store(self, uuid, tasks):
+        self._discard(uuid)
+        self._entries[uuid] = tasks
+        for task in tasks:
+            self._task_owners[task.taskid] = uuid
+
+    def _discard(self, uuid):
+        for task in self._entries.pop(uuid, None) or ():
+            self._task_owners.pop(task.taskid, None)
+
+task_cache = TaskCache()
 
 class DatabaseConnect():
+    _migrated_paths = set()
+    _migration_lock = threading.Lock()
+    _ledger_appends = {}
+    _ledger_lock = threading.Lock()
+    ledger_compact_every = 50
+    task_page_size = 50
+
     def __init__(self, db_path='appdata/app_data'):
         self.db_path = db_path
+        self._migrate()
+
+    def _migrate(self):
+        '''Brings the database schema up to date once per process
+
+        Input: None
+        Output: None'''
+        with DatabaseConnect._migration_lock:
+            if self.db_path in DatabaseConnect._migrated_paths:
+                return
+            run_migrations(self._get_conn())
+            DatabaseConnect._migrated_paths.add(self.db_path)
 
     def _get_conn(self):
-        return sqlite3.connect(self.db_path)
+        # Anything using the connection directly must see the writes still sitting in the queue
+        connection_manager.flush_writes(self.db_path)
+        return connection_manager.get(self.db_path)
+
+    def _submit_write(self, key, job, on_done=None, on_rollback=None):
+        '''Hands a write job to the database's write-behind queue
+
+        Input: tuple or None, function, function, function
+        Output: None'''
+        connection_manager.write_queue(self.db_path).submit(key, job, on_done, on_rollback)
+
+    def _append_ledger(self, cursor, uuid, delta, reason, ref=None):
+        '''Appends a money delta to the ledger without committing, compaction is queued once enough have piled up
+
+        Input: object, int, int, str, str
+        Output: None'''
+        cursor.execute(
+            'INSERT INTO ledger (uuid, delta, reason, ref) VALUES (?, ?, ?, ?)',
+            (uuid, delta, reason, None if ref is None else str(ref))
+        )
+        with DatabaseConnect._ledger_lock:
+            key = (self.db_path, uuid)
+            appended = DatabaseConnect._ledger_appends.get(key, 0) + 1
+            DatabaseConnect._ledger_appends[key] = 0 if appended >= self.ledger_compact_every else appended
+        if appended >= self.ledger_compact_every:
+            self.compact_ledger(uuid)
+
+    def _read_balance(self, cursor, uuid):
+        '''Reads a user's balance as the compacted snapshot in users.money plus the ledger deltas after it
+
+        Input: object, int
+        Output: int or None'''
+        cursor.execute(
+            'SELECT money + (SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE ledger.uuid = users.uuid) FROM users WHERE uuid = ?',
+            (uuid,)
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def compact_ledger(self, uuid):
+        '''Queues folding a user's ledger deltas into users.money, the balance reads the same before and after
+
+        Input: int
+        Output: None'''
+        def job(cursor):
+            cursor.execute('SELECT MAX(entry_id) FROM ledger WHERE uuid = ?', (uuid,))
+            last_entry = cursor.fetchone()[0]
+            if last_entry is None:
+                return
+            cursor.execute(
+                'UPDATE users SET money = money + (SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE uuid = ? AND entry_id <= ?) WHERE uuid = ?',
+                (uuid, last_entry, uuid)
+            )
+            cursor.execute('DELETE FROM ledger WHERE uuid = ? AND entry_id <= ?', (uuid, last_entry))
+
+        self._submit_write(('compact', uuid), job)
+
+    def flush_writes(self):
+        '''Waits until every queued write has been committed
+
+        Input: None
+        Output: None'''
+        connection_manager.flush_writes(self.db_path)
+
+    def set_write_error_handler(self, handler):
+        '''Registers the function told about queued writes that failed
+
+        Input: function
+        Output: None'''
+        connection_manager.on_write_error = handler
+
+    def close_connections(self):
+        '''Closes all pooled database connections
+
+        Input: None
+        Output: None'''
+        connection_manager.close_all()
+
+    def reserve_cache(self, size_kib):
+        '''Raises the page cache of the calling thread's connection, bulk writers use it so the pages of every index
+        they touch stay in memory instead of being read back for each batch
+
+        Input: int
+        Output: None'''
+        self._get_conn().execute(f'PRAGMA cache_size = -{int(size_kib)}')
+
+    def release_connection(self):
+        '''Closes the calling thread's pooled connection, background threads call it before they end
+
+        Input: None
+        Output: None'''
+        connection_manager.release(self.db_path)
+
+    def query_stats(self, order_by='total_ms', limit=None):
+        '''Returns per-statement timings and row counts plus transaction counts, empty unless profiling is enabled
+        through TIKKIT_DB_PROFILE or TIKKIT_DB_SLOW_MS before the connections were opened
+
+        Input: str, int or None
+        Output: dict'''
+        return profiler.stats(order_by, limit)
+
+    def reset_query_stats(self):
+        '''Clears the collected query statistics
+
+        Input: None
+        Output: None'''
+        profiler.reset()
+
+    @contextmanager
+    def _read_transaction(self):
+        '''Runs the enclosed queries against one consistent view of the database
+
+        Input: None
+        Output: object'''
+        conn = self._get_conn()
+        started = not conn.in_transaction
+        if started:
+            conn.execute('BEGIN')
+        try:
+            yield conn.cursor()
+        finally:
+            if started:
+                conn.commit()
+
+    def _fetch_user_tasks(self, cursor, uuid, after=None, limit=None, taskids=None, due_range=None):
+        '''Loads a user's tasks with their subtasks using one joined query, ordered by the page key.
+        after is the page key of the last task already loaded, limit caps the number of tasks, not rows,
+        taskids narrows the load to specific tasks and due_range to unfinished tasks due from start up to end, either may be None
+
+        Input: object, int, tuple, int, list, tuple
+        Output: list'''
+        # The keyset conditions and ordering repeat the expression of idx_tasks_due so the page is read off the index.
+        # SQLite only seeks a row value comparison on its first column, so a later page is read as the rest of the
+        # last task's status, seeking on its due key, followed by the statuses after it, each branch capped at the page size
+        conditions = 'uuid = ?'
+        params = [uuid]
+        if taskids is not None:
+            conditions += f" AND taskid IN ({', '.join('?' * len(taskids))})"
+            params.extend(taskids)
+        if due_range is not None:
+            start, end = due_range
+            conditions += ' AND status = 0'
+            if start is not None:
+                conditions += f' AND {TASK_DUE_KEY} >= ?'
+                params.append(start)
+            if end is not None:
+                conditions += f' AND {TASK_DUE_KEY} < ?'
+                params.append(end)
+        limit = -1 if limit is None else limit
+        columns = f'''uuid, taskid, name, date_due, time_due, deadline, status, subdivisions, reward, grant_status,
+                      due_at, {TASK_DUE_KEY} AS due_key'''
+
+        if after is None:
+            page = f'SELECT {columns} FROM tasks WHERE {conditions} ORDER BY status, {TASK_DUE_KEY}, taskid LIMIT ?'
+            page_params = params + [limit]
+        else:
+            status, due_key, taskid = after
+            page = f'''SELECT * FROM (
+                           SELECT {columns} FROM tasks
+                           WHERE {conditions} AND status = ? AND {TASK_DUE_KEY} >= ? AND ({TASK_DUE_KEY} > ? OR taskid > ?)
+                           ORDER BY {TASK_DUE_KEY}, taskid LIMIT ?
+                       )
+                       UNION ALL
+                       SELECT * FROM (
+                           SELECT {columns} FROM tasks
+                           WHERE {conditions} AND status > ?
+                           ORDER BY status, {TASK_DUE_KEY}, taskid LIMIT ?
+                       )
+                       ORDER BY status, due_key, taskid LIMIT ?'''
+            page_params = params + [status, due_key, due_key, taskid, limit] + params + [status, limit, limit]
+
+        cursor.execute(
+            f'''WITH page AS ({page})
+               SELECT t.uuid, t.taskid, t.name, t.date_due, t.time_due, t.deadline, t.status,
+                      t.subdivisions, t.reward, t.grant_status, t.due_at,
+                      s.parent_id, s.subtask_id, s.subtask_order, s.name, s.status
+               FROM page t
+               LEFT JOIN subtasks s ON s.parent_id = t.taskid
+               ORDER BY t.status, t.due_key, t.taskid, s.subtask_order, s.subtask_id''',
+            page_params
+        )
+
+        # Rows arrive grouped by taskid, so each task is built and its subtasks attached in a single pass
+        user_task_list = []
+        current_task = None
+        for row in cursor:
+            if current_task is None or current_task.taskid != row[1]:
+                current_task = UserTask(
+                    uuid=row[0], taskid=row[1], name=row[2], date_due=row[3], time_due=row[4],
+                    deadline=row[5], status=row[6], subdivisions=row[7], reward=row[8],
+                    grant_status=row[9], due_at=row[10], subtasks=[] if row[7] != 0 else None
+                )
+                user_task_list.append(current_task)
+
+            if row[12] is not None and current_task.subtasks is not None:
+                current_task.subtasks.append({
+                    'parent_id': row[11], 'subtask_id': row[12], 'subtask_order': row[13],
+                    'name': row[14], 'status': row[15]
+                })
+
+        return user_task_list
 
 class DatabaseManager(DatabaseConnect):
     def __init__(self):
@@ -72,25 +767,45 @@ class DatabaseManager(DatabaseConnect):
             conn.commit()
 
     def update_user_money(self, uuid, money):
-        '''Updates specific user id's money value
+        '''Queues overwriting specific user id's balance, the ledger written so far is dropped as the new value already includes it.
+        Only the latest pending value is written
 
         Input: int, int
         Output: None'''
-        with self._get_conn() as conn:
-            conn.cursor().execute('UPDATE users SET money = ? WHERE uuid = ?', (money, uuid))
-            conn.commit()
+        def job(cursor):
+            cursor.execute('UPDATE users SET money = ? WHERE uuid = ?', (money, uuid))
+            cursor.execute('DELETE FROM ledger WHERE uuid = ?', (uuid,))
+
+        self._submit_write(('money', uuid), job)
+
+    def record_purchase(self, uuid, item_name, item_type, price):
+        '''Queues a purchase as a ledger debit together with the inventory unit it bought, in one transaction
+
+        Input: int, str, str, int
+        Output: None'''
+        def job(cursor):
+            self._append_ledger(cursor, uuid, -price, 'purchase', item_name)
+            # Clothes are owned once, furniture stacks
+            quantity_sql = 'quantity + 1' if item_type == 'furn' else '1'
+            cursor.execute(
+                f'UPDATE inventory SET quantity = {quantity_sql} WHERE uuid = ? AND item_name = ? AND item_type = ?',
+                (uuid, item_name, item_type)
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    'INSERT INTO inventory (uuid, item_name, item_type, quantity) VALUES (?, ?, ?, ?)',
+                    (uuid, item_name, item_type, 1)
+                )
+
+        self._submit_write(None, job)
 
     def query_user_money(self, uuid):
-        '''Collects specific user id's money value from database
+        '''Collects specific user id's balance from database
 
         Input: int
         Output: int'''
         with self._get_conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT money FROM users WHERE uuid = ?', (uuid,))
-            result = cursor.fetchone()
-
-        return result[0]
+            return self._read_balance(conn.cursor(), uuid)
     
     def add_user_inv_furniture(self, uuid, inv_dict):
         '''Adds specific user id's furniture inventory to database after clearing old items
@@ -98,16 +813,8 @@ class DatabaseManager(DatabaseConnect):
         Input: int, dict
         Output: None'''
         with self._get_conn() as conn:
-            conn.cursor().execute('DELETE FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, 'furn'))
+            self._write_inv_furniture(conn.cursor(), uuid, inv_dict)
             conn.commit()
-
-        for item, quantity in inv_dict.items():
-            with self._get_conn() as conn:
-                conn.cursor().execute(
-                    'INSERT INTO inventory (uuid, item_name, item_type, quantity) VALUES (?, ?, ?, ?)',
-                    (uuid, item, 'furn',quantity)
-                )
-                conn.commit()
     
     def add_user_eqp_furniture(self, uuid, placed_furniture):
         '''Adds specific user id's placed furniture to database after clearing old items
@@ -115,36 +822,169 @@ class DatabaseManager(DatabaseConnect):
         Input: int, list
         Output: None'''
         with self._get_conn() as conn:
-            conn.cursor().execute('DELETE FROM placed_furniture WHERE uuid = ?', (uuid,))
+            self._write_eqp_furniture(conn.cursor(), uuid, placed_furniture)
             conn.commit()
 
+    def save_user_state(self, uuid, inventory_furniture=None, placed_furniture=None, inventory_clothes=None, equipped_clothes=None, removed_furniture=None):
+        '''Queues any given parts of a user's inventory, placed furniture and equipped clothes to be written in a single transaction, parts left as None are untouched.
+        Placed furniture is saved as a diff: only new, dirty and removed records are written
+
+        Input: int, object, list, object, dict, list
+        Output: None'''
+        # Everything is copied now so later edits on the GUI thread cannot leak into this write
+        if inventory_furniture is not None:
+            inventory_furniture = Inventory(inventory_furniture)
+        if inventory_clothes is not None:
+            inventory_clothes = Inventory(inventory_clothes)
+        if equipped_clothes is not None:
+            equipped_clothes = dict(equipped_clothes)
+
+        changed, removed, inserted = [], [], []
+        if placed_furniture is not None:
+            changed, removed = self._capture_furniture_diff(placed_furniture, removed_furniture)
+
+        def job(cursor):
+            if inventory_furniture is not None:
+                self._write_inv_furniture(cursor, uuid, inventory_furniture)
+            if placed_furniture is not None:
+                inserted.extend(self._sync_eqp_furniture(cursor, uuid, changed, removed))
+            if inventory_clothes is not None:
+                self._write_inv_clothes(cursor, uuid, inventory_clothes)
+            if equipped_clothes is not None:
+                self._write_eqp_clothes(cursor, uuid, equipped_clothes)
+
+        def rollback():
+            # Row ids handed out inside the undone transaction are not real, and the diff has to be saved again
+            for item in inserted:
+                item.pop('item_id', None)
+            inserted.clear()
+            for item, _ in changed:
+                item['dirty'] = True
+            for item in removed:
+                if not any(pending is item for pending in removed_furniture):
+                    removed_furniture.append(item)
+
+        # A furniture diff builds on the diffs queued before it, so only full clothing saves may replace each other
+        key = ('clothes', uuid) if placed_furniture is None and inventory_furniture is None else None
+        self._submit_write(key, job, on_rollback=rollback)
+
+    def _capture_furniture_diff(self, placed_furniture, removed_furniture):
+        '''Snapshots new, dirty and removed placed furniture records and clears their pending state
+
+        Input: list, list
+        Output: list, list'''
+        changed = []
         for item in placed_furniture:
-            with self._get_conn() as conn:
-                conn.cursor().execute(
-                    'INSERT INTO placed_furniture (uuid, name, angle_index, x, y, z) VALUES (?, ?, ?, ?, ? , ?)',
-                    (uuid, item['name'], item['angle_index'], item['x'], item['y'], item['z'])
-                    )
-                conn.commit()
-        
-        return
+            if item.get('item_id') is None or item.get('dirty'):
+                changed.append((item, (item['angle_index'], item['x'], item['y'], item['z'])))
+                item['dirty'] = False
+
+        removed = list(removed_furniture or [])
+        if removed_furniture:
+            removed_furniture.clear()
+
+        return changed, removed
+
+    def _write_inv_furniture(self, cursor, uuid, inventory):
+        '''Replaces furniture inventory rows without committing
+
+        Input: object, int, object
+        Output: None'''
+        self._write_inventory(cursor, uuid, 'furn', inventory)
+
+    def _write_inventory(self, cursor, uuid, item_type, inventory):
+        '''Replaces one type of inventory rows with one row per item carrying its quantity, without committing
+
+        Input: object, int, str, object
+        Output: None'''
+        if not isinstance(inventory, Inventory):
+            inventory = Inventory(inventory)
+        cursor.execute('DELETE FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, item_type))
+        cursor.executemany(
+            'INSERT INTO inventory (uuid, item_name, item_type, quantity) VALUES (?, ?, ?, ?)',
+            [(uuid, item, item_type, quantity) for item, quantity in inventory.rows()]
+        )
+
+    def _write_eqp_furniture(self, cursor, uuid, placed_furniture):
+        '''Replaces placed furniture rows without committing
+
+        Input: object, int, list
+        Output: None'''
+        cursor.execute('DELETE FROM placed_furniture WHERE uuid = ?', (uuid,))
+        cursor.executemany(
+            'INSERT INTO placed_furniture (uuid, name, angle_index, x, y, z) VALUES (?, ?, ?, ?, ?, ?)',
+            [(uuid, item['name'], item['angle_index'], item['x'], item['y'], item['z']) for item in placed_furniture]
+        )
+
+    def _sync_eqp_furniture(self, cursor, uuid, changed, removed):
+        '''Deletes removed rows, updates changed rows and inserts new rows of placed furniture without committing.
+        Ids are read at write time, so a record inserted by an earlier queued save is updated rather than inserted twice,
+        and new records get their row id written back as item_id
+
+        Input: object, int, list, list
+        Output: list'''
+        cursor.executemany(
+            'DELETE FROM placed_furniture WHERE item_id = ? AND uuid = ?',
+            [(item['item_id'], uuid) for item in removed if item.get('item_id') is not None]
+        )
+
+        cursor.executemany(
+            'UPDATE placed_furniture SET angle_index = ?, x = ?, y = ?, z = ? WHERE item_id = ? AND uuid = ?',
+            [values + (item['item_id'], uuid) for item, values in changed if item.get('item_id') is not None]
+        )
+
+        inserted = []
+        for item, (angle_index, x, y, z) in changed:
+            if item.get('item_id') is None:
+                cursor.execute(
+                    'INSERT INTO placed_furniture (uuid, name, angle_index, x, y, z) VALUES (?, ?, ?, ?, ?, ?)',
+                    (uuid, item['name'], angle_index, x, y, z)
+                )
+                item['item_id'] = cursor.lastrowid
+                inserted.append(item)
+
+        return inserted
+
+    def _write_inv_clothes(self, cursor, uuid, inventory):
+        '''Replaces clothing inventory rows without committing
+
+        Input: object, int, object
+        Output: None'''
+        self._write_inventory(cursor, uuid, 'clothe', inventory)
+
+    def _write_eqp_clothes(self, cursor, uuid, equipped_clothes):
+        '''Updates equipped clothes row without committing
+
+        Input: object, int, dict
+        Output: None'''
+        cursor.execute(
+            'UPDATE equipped_clothes SET Head = ?, Torso = ?, Legs = ?, Feet = ? WHERE uuid = ?', 
+            (equipped_clothes['Head'], equipped_clothes['Torso'], equipped_clothes['Legs'], equipped_clothes['Feet'], uuid)
+        )
 
     def query_user_inv_furniture(self, uuid):
         '''Collects specific user id's inventory furniture from database
 
         Input: int
-        Output: list'''
+        Output: object'''
         with self._get_conn() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT item_name, quantity FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, 'furn'))
             result = cursor.fetchall()
-        
-        inv_furn_list = []
-        for item in result:
-            item_name, quantity = item
-            for _ in range(quantity):
-                inv_furn_list.append(item_name)
-        
-        return inv_furn_list
+
+        return self._inventory_from_rows(result)
+
+    def _inventory_from_rows(self, rows, minimum=0):
+        '''Builds an inventory from (item_name, quantity) rows, quantities below minimum are raised to it
+
+        Input: list, int
+        Output: object'''
+        inventory = Inventory()
+        for item_name, quantity in rows:
+            quantity = max(quantity or 0, minimum)
+            if quantity > 0:
+                inventory.add(item_name, quantity)
+        return inventory
 
 
     def query_user_eqp_furniture(self, uuid):
@@ -153,9 +993,9 @@ class DatabaseManager(DatabaseConnect):
         Input: int
         Output: list'''
         with self._get_conn() as conn:
-            conn.row_factory = sqlite3.Row 
             cursor = conn.cursor()
-            cursor.execute(f"SELECT name, angle_index, x, y, z FROM placed_furniture WHERE uuid = (?)", (uuid,))
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(f"SELECT item_id, name, angle_index, x, y, z FROM placed_furniture WHERE uuid = (?)", (uuid,))
             rows = cursor.fetchall()
             
         row_list = []
@@ -183,10 +1023,7 @@ class DatabaseManager(DatabaseConnect):
         Input: int, dict
         Output: None'''
         with self._get_conn() as conn:
-            conn.cursor().execute(
-                'UPDATE equipped_clothes SET Head = ?, Torso = ?, Legs = ?, Feet = ? WHERE uuid = ?', 
-                (equipped_clothes['Head'], equipped_clothes['Torso'], equipped_clothes['Legs'], equipped_clothes['Feet'], uuid)
-            )
+            self._write_eqp_clothes(conn.cursor(), uuid, equipped_clothes)
             conn.commit()
 
     def add_user_inv_clothes(self, uuid, item_list):
@@ -195,18 +1032,8 @@ class DatabaseManager(DatabaseConnect):
         Input: int, dict
         Output: None'''
         with self._get_conn() as conn:
-            conn.cursor().execute('DELETE FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, 'clothe'))
+            self._write_inv_clothes(conn.cursor(), uuid, item_list)
             conn.commit()
-
-        for item in item_list:
-            with self._get_conn() as conn:
-                conn.cursor().execute(
-                    'INSERT INTO inventory (uuid, item_name, item_type) VALUES (?, ?, ?)',
-                    (uuid, item, 'clothe')
-                    )
-                conn.commit()
-        
-        return
     
     def query_user_eqp_clothes(self, uuid):
         '''Collects specific user id's equipped clothes from database
@@ -214,8 +1041,8 @@ class DatabaseManager(DatabaseConnect):
         Input: int
         Output: dict'''
         with self._get_conn() as conn:
-            conn.row_factory = sqlite3.Row 
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute(f"SELECT Head, Torso, Legs, Feet FROM equipped_clothes WHERE uuid = (?)", (uuid,))
             row = cursor.fetchone()
         
@@ -224,30 +1051,55 @@ class DatabaseManager(DatabaseConnect):
         else:
             return dict(row)
     
+    def query_user_snapshot(self, uuid):
+        '''Collects money, inventory, placed furniture, equipped clothes and tasks of a user inside one read transaction
+
+        Input: int
+        Output: object'''
+        with self._read_transaction() as cursor:
+            money = self._read_balance(cursor, uuid) or 0
+
+            cursor.execute('SELECT item_name, item_type, quantity FROM inventory WHERE uuid = ?', (uuid,))
+            furn_rows = []
+            clothes_rows = []
+            for item_name, item_type, quantity in cursor.fetchall():
+                if item_type == 'furn':
+                    furn_rows.append((item_name, quantity))
+                elif item_type == 'clothe':
+                    clothes_rows.append((item_name, quantity))
+            inv_furn = self._inventory_from_rows(furn_rows)
+            inv_clothes = self._inventory_from_rows(clothes_rows, minimum=1)
+
+            cursor.execute('SELECT item_id, name, angle_index, x, y, z FROM placed_furniture WHERE uuid = ?', (uuid,))
+            columns = [column[0] for column in cursor.description]
+            placed_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+            cursor.execute('SELECT Head, Torso, Legs, Feet FROM equipped_clothes WHERE uuid = ?', (uuid,))
+            row = cursor.fetchone()
+            equipped_clothes = dict(zip(('Head', 'Torso', 'Legs', 'Feet'), row)) if row else {}
+
+            user_task_list = self._fetch_user_tasks(cursor, uuid, limit=self.task_page_size)
+
+        return UserSnapshot(uuid, money, inv_furn, placed_list, inv_clothes, equipped_clothes, user_task_list)
+
     def query_user_inv_clothes(self, uuid):
         '''Collects specific user id's inevntory clothes from database
 
         Input: int
-        Output: list'''
-        inv = []
-
+        Output: object'''
         with self._get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT item_name FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, 'clothe'))
+            cursor.execute('SELECT item_name, quantity FROM inventory WHERE uuid = ? AND item_type = ?', (uuid, 'clothe'))
             result = cursor.fetchall()
 
-        for i in range(len(result)):
-            inv.append(result[i][0])
-        
-        if not inv:
-            return []
-        else:
-            return inv
+        # Clothing rows written before quantities were tracked hold 0, owning one is what the row means
+        return self._inventory_from_rows(result, minimum=1)
 
 class UserManager():
     def __init__(self, db_manager):
         self.db = db_manager
         self.current_uuid = None
+        self.task_cache = task_cache
 
     def validate_and_register(self, username, password, confirm_password):
         '''Ensures specific conditons met before registering user
@@ -313,9 +1165,18 @@ class UserManager():
         Output: None'''
         if user_uuid:
             self.db.update_status(user_uuid, 0)
+            self.db.compact_ledger(user_uuid)
+            self.task_cache.invalidate(user_uuid)
+
+    def record_purchase(self, uuid, item_name, item_type, price):
+        '''Records a store purchase in the ledger through data manager
+
+        Input: int, str, str, int
+        Output: None'''
+        self.db.record_purchase(uuid, item_name, item_type, price)
 
     def save_user_money(self, uuid, money):
-        '''Updates specific user id's currency value through data manager
+        '''Overwrites specific user id's balance through data manager
 
         Input: int, int
         Output: None'''
@@ -328,25 +1189,18 @@ class UserManager():
         Output: int'''
         return self.db.query_user_money(uuid)
     
-    def save_user_furniture_data(self, uuid, inventory_furniture, placed_furniture):
+    def save_user_furniture_data(self, uuid, inventory_furniture, placed_furniture, removed_furniture=None):
         '''Updates specific user id's complete furniture data through data manager
 
-        Input: int, list, list
+        Input: int, object, list, list
         Output: int'''
-        inv_set = set(inventory_furniture)
-        inv_dict = {}
-
-        for item in inv_set:
-            inv_dict[item] = inventory_furniture.count(item)
-
-        self.db.add_user_inv_furniture(uuid, inv_dict)
-        self.db.add_user_eqp_furniture(uuid, placed_furniture)
+        self.db.save_user_state(uuid, inventory_furniture=inventory_furniture, placed_furniture=placed_furniture, removed_furniture=removed_furniture)
 
     def retrieve_user_furniture_data(self, uuid):
         '''Collect specific user id's complete furniture data through data manager
 
         Input: int
-        Output: list, list'''
+        Output: object, list'''
         inv_furn_list = self.db.query_user_inv_furniture(uuid)
         place_items_list = self.db.query_user_eqp_furniture(uuid)
 
@@ -355,16 +1209,34 @@ class UserManager():
     def save_user_clothe_data(self, uuid, invenory_clothes, equipped_clothes):
         '''Updates specific user id's complete clothing data through data manager
 
-        Input: int, list, dict
+        Input: int, object, dict
         Output: None'''
-        self.db.update_user_eqp_clothes(uuid, equipped_clothes)
-        self.db.add_user_inv_clothes(uuid, invenory_clothes)
+        self.db.save_user_state(uuid, inventory_clothes=invenory_clothes, equipped_clothes=equipped_clothes)
+
+    def load_user_snapshot(self, uuid):
+        '''Collect specific user id's complete game data and task list in one read through data manager
+
+        Input: int
+        Output: object'''
+        snapshot = self.db.query_user_snapshot(uuid)
+        # Deltas left over from a session that never logged out are folded in the background
+        self.db.compact_ledger(uuid)
+        # The task list came from the same read, so the first trip back home is already a cache hit
+        self.task_cache.put(uuid, snapshot.tasks)
+        return snapshot
+
+    def cache_stats(self):
+        '''Returns hit and miss counters of the per-user task cache
+
+        Input: None
+        Output: dict'''
+        return self.task_cache.stats()
 
     def retrieve_user_clothe_data(self, uuid):
         '''Collect specific user id's complete clothing data through data manager
 
         Input: int
-        Output: list, dict'''
+        Output: object, dict'''
         equipped_clothes = self.db.query_user_eqp_clothes(uuid)
         inventory_clothes = self.db.query_user_inv_clothes(uuid)
 
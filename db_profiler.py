@@ -0,0 +1,255 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger('tikkit.db')
+
+### Statement level profiling, only connections opened while it is enabled are instrumented ###
+class StatementStats():
+    def __init__(self, sql):
+        '''Running totals for one SQL statement text
+
+        Input: str
+        Output: None'''
+        self.sql = sql
+        self.calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def as_dict(self):
+        '''Returns the totals as a plain dict, times in milliseconds
+
+        Input: None
+        Output: dict'''
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'rows': self.rows,
+            'total_ms': self.total_time * 1000,
+            'avg_ms': self.total_time * 1000 / self.calls if self.calls else 0.0,
+            'max_ms': self.max_time * 1000
+        }
+
+class QueryProfiler():
+    def __init__(self, enabled=False, slow_query_ms=None):
+        '''Collects statement timings, row counts and transaction counts from every profiled connection
+
+        Input: bool, float or None
+        Output: None'''
+        self.slow_query_ms = slow_query_ms
+        self.enabled = enabled or slow_query_ms is not None
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_environment(cls):
+        '''Reads TIKKIT_DB_PROFILE to turn profiling on and TIKKIT_DB_SLOW_MS to also log statements slower than it
+
+        Input: None
+        Output: object'''
+        enabled = os.environ.get('TIKKIT_DB_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+        slow_query_ms = os.environ.get('TIKKIT_DB_SLOW_MS')
+        try:
+            slow_query_ms = float(slow_query_ms) if slow_query_ms else None
+        except ValueError:
+            slow_query_ms = None
+        return cls(enabled, slow_query_ms)
+
+    def enable(self, slow_query_ms=None):
+        '''Turns profiling on for connections opened from now on
+
+        Input: float or None
+        Output: None'''
+        self.enabled = True
+        if slow_query_ms is not None:
+            self.slow_query_ms = slow_query_ms
+
+    def disable(self):
+        '''Stops instrumenting new connections, already profiled ones keep reporting until closed
+
+        Input: None
+        Output: None'''
+        self.enabled = False
+
+    def reset(self):
+        '''Clears every collected total
+
+        Input: None
+        Output: None'''
+        with self._lock:
+            self._statements = {}
+            self.transactions = 0
+            self.commits = 0
+            self.rollbacks = 0
+
+    def record(self, sql, elapsed, rows, calls=1):
+        '''Adds one execution, or the fetch time and rows of one, to a statement's totals
+
+        Input: str, float, int, int
+        Output: None'''
+        with self._lock:
+            stats = self._statements.get(sql)
+            if stats is None:
+                stats = self._statements[sql] = StatementStats(sql)
+            stats.calls += calls
+            stats.rows += rows
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+
+    def record_transaction(self, committed):
+        '''Counts a finished transaction
+
+        Input: bool
+        Output: None'''
+        with self._lock:
+            self.transactions += 1
+            if committed:
+                self.commits += 1
+            else:
+                self.rollbacks += 1
+
+    def check_slow(self, sql, elapsed):
+        '''Logs a statement execution that went over the slow query threshold together with the code that ran it
+
+        Input: str, float
+        Output: None'''
+        if self.slow_query_ms is None or elapsed * 1000 < self.slow_query_ms:
+            return
+        logger.warning('slow query %.1f ms in %s: %s', elapsed * 1000, self._caller(), ' '.join(sql.split()))
+
+    def _caller(self):
+        '''Names the closest frames outside this module, the writer thread's jobs show up by their qualified name
+
+        Input: None
+        Output: str'''
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None and len(frames) < 3:
+            if frame.f_globals.get('__name__') != __name__:
+                code = frame.f_code
+                frames.append(getattr(code, 'co_qualname', code.co_name))
+            frame = frame.f_back
+        return ' < '.join(frames)
+
+    def stats(self, order_by='total_ms', limit=None):
+        '''Returns statement totals sorted from most to least expensive, plus transaction counts
+
+        Input: str, int or None
+        Output: dict'''
+        with self._lock:
+            statements = [stats.as_dict() for stats in self._statements.values()]
+            result = {
+                'transactions': self.transactions,
+                'commits': self.commits,
+                'rollbacks': self.rollbacks
+            }
+        statements.sort(key=lambda stats: stats[order_by], reverse=True)
+        result['statements'] = statements[:limit] if limit is not None else statements
+        return result
+
+profiler = QueryProfiler.from_environment()
+
+class ProfiledCursor(sqlite3.Cursor):
+    '''Cursor timing each execute and the fetches that follow it'''
+    def _begin(self, sql):
+        self._sql = sql
+        self._elapsed = 0.0
+        self._logged = False
+
+    def _finish(self, elapsed, rows, calls=0):
+        profiler.record(self._sql, elapsed, rows, calls)
+        self._elapsed += elapsed
+        if not self._logged and profiler.slow_query_ms is not None and self._elapsed * 1000 >= profiler.slow_query_ms:
+            self._logged = True
+            profiler.check_slow(self._sql, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(time.perf_counter() - start, max(self.rowcount, 0), calls=1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(time.perf_counter() - start, max(self.rowcount, 0), calls=1)
+
+    def executescript(self, sql_script):
+        self._begin(sql_script)
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._finish(time.perf_counter() - start, 0, calls=1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if getattr(self, '_sql', None) is not None:
+            self._finish(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if getattr(self, '_sql', None) is not None:
+            self._finish(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if getattr(self, '_sql', None) is not None:
+            self._finish(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        if getattr(self, '_sql', None) is not None:
+            self._finish(time.perf_counter() - start, 1)
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    '''Connection handing out profiled cursors and counting transactions as they end'''
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        was_open = self.in_transaction
+        super().commit()
+        if was_open:
+            profiler.record_transaction(True)
+
+    def rollback(self):
+        was_open = self.in_transaction
+        super().rollback()
+        if was_open:
+            profiler.record_transaction(False)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The built-in context manager commits in C without going through commit(), so count it here
+        was_open = self.in_transaction
+        result = super().__exit__(exc_type, exc_value, traceback)
+        if was_open and not self.in_transaction:
+            profiler.record_transaction(exc_type is None)
+        return result
@@ -0,0 +1,144 @@
+import itertools
+import queue
+from PyQt6.QtCore import QThread, pyqtSignal
+from semantic_cache import SemanticCache
+
+### Task enrichment off the GUI thread, drafts are priced and planned one at a time by the AI engine ###
+class EnrichmentWorker(QThread):
+    '''Runs AI enrichment of saved task drafts on its own thread, new tasks go ahead of older unpriced ones'''
+    enriched = pyqtSignal(int, object, object)
+    enrichment_failed = pyqtSignal(int, str)
+    model_unavailable = pyqtSignal(str)
+    queue_empty = pyqtSignal()
+
+    # Lower numbers are taken first
+    NEW_TASK = 0
+    BACKLOG = 1
+    STOP = -1
+
+    def __init__(self, engine, cache=None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.cache = cache
+        self.semantic = SemanticCache(cache) if cache is not None else None
+        self.drafts = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.pending = set()
+
+    def submit(self, taskid, name, subdivisions, priority=NEW_TASK):
+        '''Queues a saved task for enrichment, the result arrives through enriched
+
+        Input: int, str, int, int
+        Output: None'''
+        if taskid in self.pending:
+            return
+        self.pending.add(taskid)
+        self.drafts.put((priority, next(self.order), (taskid, name, subdivisions)))
+        if not self.isRunning():
+            self.start(QThread.Priority.LowPriority)
+
+    def clear(self):
+        '''Drops every draft not yet started, the tasks keep their pending reward until queued again
+
+        Input: None
+        Output: None'''
+        while True:
+            try:
+                priority, order, draft = self.drafts.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(draft[0])
+
+    def stop(self):
+        '''Finishes the draft in progress and ends the thread
+
+        Input: None
+        Output: None'''
+        self.clear()
+        if self.isRunning():
+            self.drafts.put((self.STOP, next(self.order), None))
+            self.wait()
+
+    def enrich(self, name, subdivisions):
+        '''Answers a draft from the inference cache when the same task was enriched before, otherwise runs the model and caches its answer
+
+        Input: str, int
+        Output: int, dict'''
+        if self.cache is None:
+            return self.engine.enrich_task(name, subdivisions)
+        key = self.engine.cache_key(name, subdivisions)
+        cached = self.cache.fetch_inference(key)
+        if self.complete(cached, subdivisions):
+            self.cache.note_inference_lookup(True)
+            return cached
+
+        # A reworded task is answered from its nearest cached neighbour, and keeps that answer under its own key too
+        scope = self.engine.cache_scope()
+        vector = self.embed(name)
+        if vector is not None:
+            cached = self.semantic.lookup(scope, vector, subdivisions)
+            if self.complete(cached, subdivisions):
+                self.cache.note_inference_lookup(True)
+                self.cache.store_inference(key, *cached)
+                return cached
+        self.cache.note_inference_lookup(False)
+
+        reward, subtasks = self.engine.enrich_task(name, subdivisions)
+        # Only a full answer is kept, a partial one would be handed to every later copy of the task
+        if self.complete((reward, subtasks), subdivisions):
+            self.cache.store_inference(key, reward, subtasks)
+            if vector is not None:
+                self.semantic.add(scope, vector, key, subdivisions)
+        return reward, subtasks
+
+    def complete(self, answer, subdivisions):
+        '''Tells whether an answer has a reward and, for a divided task, every requested step
+
+        Input: tuple, int
+        Output: bool'''
+        if answer is None or answer[0] is None:
+            return False
+        return not subdivisions or (bool(answer[1]) and len(answer[1]) >= subdivisions)
+
+    def embed(self, name):
+        '''Embeds a task name for the semantic cache, None when the model cannot embed so the draft is only generated
+
+        Input: str
+        Output: object'''
+        try:
+            return self.engine.embed_task(name)
+        except Exception:
+            return None
+
+    def run(self):
+        while True:
+            priority, order, draft = self.drafts.get()
+            if draft is None:
+                if self.cache is not None:
+                    self.cache.release_connection()
+                return
+            taskid, name, subdivisions = draft
+            try:
+                reward, subtasks = self.enrich(name, subdivisions)
+            except Exception as e:
+                if self.engine.load_failed():
+                    self.pending.discard(taskid)
+                    self.model_unavailable.emit(str(e))
+                    continue
+                # Only this draft's plan failed, a divided task is priced on its own and kept as a single task
+                # rather than left divided with no steps
+                reward = None
+                if subdivisions:
+                    try:
+                        reward, subtasks = self.enrich(name, 0)
+                    except Exception:
+                        pass
+                if reward is None:
+                    self.pending.discard(taskid)
+                    self.enrichment_failed.emit(taskid, f'Could not price {name!r}: {e}')
+                    continue
+                self.enrichment_failed.emit(taskid, f'Could not plan the steps of {name!r}, it was kept as a single task: {e}')
+            self.pending.discard(taskid)
+            self.enriched.emit(taskid, reward, subtasks)
+            if self.drafts.empty():
+                self.queue_empty.emit()
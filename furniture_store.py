@@ -122,8 +122,9 @@ class FurnitureCard(QFrame):
 class FurnitureView(QWidget):
     request_clothing_view = pyqtSignal()
     request_home_view = pyqtSignal()
-    request_save_layout = pyqtSignal(list, list)
+    request_save_layout = pyqtSignal(object, object, object)
     money_changed = pyqtSignal(int)
+    purchase_completed = pyqtSignal(str, str, int)
 
     def __init__(self, game_data):
         '''Initialize main view, loads in assets and builds the UI
@@ -455,7 +456,8 @@ class FurnitureView(QWidget):
         output: bool'''
         if self.game_data.money >= item_price:
             self.game_data.money -= item_price
-            self.game_data.inventory_furniture.append(item_name)
+            self.game_data.inventory_furniture.add(item_name)
+            self.purchase_completed.emit(item_name, 'furn', item_price)
             self.refresh_page(self.game_data) 
             self.money_changed.emit(self.game_data.money)
             return True
@@ -541,7 +543,7 @@ class FurnitureView(QWidget):
       
     def save_layout(self):
         '''ouptuts a signal withh the current inventory and what items are placed'''
-        self.request_save_layout.emit(self.game_data.inventory_furniture, self.game_data.placed_furniture)    
+        self.request_save_layout.emit(self.game_data.inventory_furniture, self.game_data.placed_furniture, self.game_data.removed_furniture)    
 
     def load_layout(self, data=None):
         '''gets the placed items from saved items and sorts by Z index
@@ -636,6 +638,7 @@ class DraggableFurniture(QLabel):
             # Use modulo (%) so if index is 3 and len is 4, 4%4 becomes 0 (loops back to start)
             self.angle_index = (self.angle_index + 1) % len(self.image_paths) 
             self.item_data['angle_index'] = self.angle_index
+            self.item_data['dirty'] = True
             self.update_image()
 
     def mousePressEvent(self, event):
@@ -669,6 +672,7 @@ class DraggableFurniture(QLabel):
             self.move(safex, safey)
             self.item_data['x'] = safex
             self.item_data['y'] = safey
+            self.item_data['dirty'] = True
 
     def mouseReleaseEvent(self, event):
         '''Resets the cursor and drag state when mouse is realease'''
@@ -689,12 +693,15 @@ class DraggableFurniture(QLabel):
             
             # Set this item to max + 1 so it on top
             self.item_data['z'] = current_max_z + 1
+            self.item_data['dirty'] = True
             self.raise_()
 
     def delete_item(self):
         '''remove item from placed furniture'''
         if self.item_data in self.parent_view.game_data.placed_furniture:
             self.parent_view.game_data.placed_furniture.remove(self.item_data)
+            # The next save deletes its row, if it never got one there is nothing to delete
+            self.parent_view.game_data.removed_furniture.append(self.item_data)
             self.deleteLater()
 
     def keyPressEvent(self, event):
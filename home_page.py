@@ -2,11 +2,14 @@ from PyQt6.QtWidgets import (QWidget,
                              QPushButton, QLabel, QGraphicsScene, 
                              QGraphicsView, QGraphicsPixmapItem, 
                              QVBoxLayout, QFrame, QHBoxLayout, 
-                             QSizePolicy, QDialog, QGridLayout, 
-                             QCheckBox, QScrollArea,QLayout)
-from PyQt6.QtCore import Qt, pyqtSignal, QPropertyAnimation, QEasingCurve, QRectF
-from PyQt6.QtGui import QPixmap
+                             QSizePolicy, QDialog, QListView,
+                             QAbstractItemView, QStyledItemDelegate,
+                             QLineEdit)
+from PyQt6.QtCore import (Qt, pyqtSignal, QPropertyAnimation, QEasingCurve, QRectF,
+                          QRect, QSize, QEvent, QAbstractListModel, QModelIndex, QTimer)
+from PyQt6.QtGui import QPixmap, QPainter, QColor, QPen, QFont
 from store_utils import default_theme
+from data_manager import URGENCY_GROUPS, urgency_bounds, urgency_group
 import os
 
 
@@ -20,8 +23,10 @@ class RoomScene(QWidget):
     request_furniture_store = pyqtSignal()
     request_task_entry = pyqtSignal()
     request_task_status_update = pyqtSignal(int, int) 
-    request_subtask_status_update = pyqtSignal(object, int, int, int)
+    request_subtask_status_update = pyqtSignal(int, int, int)
     request_task_removal = pyqtSignal(int)
+    request_more_tasks = pyqtSignal()
+    request_task_search = pyqtSignal(str)
 
     def __init__(self, game_data):
         '''builds cameraview and panels
@@ -86,17 +91,37 @@ class RoomScene(QWidget):
         lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(lbl) 
 
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setStyleSheet(self.styles.scrollbar_style())
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-
-        self.card_container = QWidget()
-        self.card_container.setStyleSheet("background: transparent;")
-        
-        self.card_container_layout = QVBoxLayout(self.card_container)
-        self.card_container_layout.setSpacing(10)
-        self.card_container_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        #search box, queries go out once typing pauses instead of on every keystroke
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText('Search tasks...')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setFixedHeight(35)
+        self.search_box.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {self.styles.col_secondary};
+                border: 2px solid {self.styles.col_border};
+                border-radius: 10px;
+                padding: 5px;
+                color: {self.styles.col_text};
+            }}
+        """)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.emit_task_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+        layout.addWidget(self.search_box)
+
+        #tasks are painted rows of a list model, the view asks the model for the next page once scrolled to the end
+        self.task_model = TaskListModel()
+        self.task_model.request_more.connect(self.request_more_tasks.emit)
+        self.task_delegate = TaskCardDelegate(self.styles)
+        self.task_delegate.task_toggled.connect(self.toggle_task)
+        self.task_delegate.subtask_toggled.connect(self.toggle_subtask)
+        self.task_delegate.expand_toggled.connect(self.task_model.toggle_expanded)
+        self.task_delegate.delete_clicked.connect(self.request_task_removal.emit)
+        self.task_view = TaskListView(self.task_model, self.task_delegate, self.styles)
+        self.task_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
         task_entry_nav = QPushButton('Add Task')
         task_entry_nav.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -104,8 +129,7 @@ class RoomScene(QWidget):
         task_entry_nav.setStyleSheet(self.styles.action_button_style())
         task_entry_nav.clicked.connect(self.request_task_entry.emit)
 
-        self.scroll_area.setWidget(self.card_container)
-        layout.addWidget(self.scroll_area)
+        layout.addWidget(self.task_view)
 
         layout.addWidget(task_entry_nav, 0, Qt.AlignmentFlag.AlignHCenter)        
     
@@ -175,7 +199,7 @@ class RoomScene(QWidget):
         cur = self.side_panel.width()
         target = 350 if cur == 0 else 0
         
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.task_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         
         self.anim1 = QPropertyAnimation(self.side_panel, b"minimumWidth")
         self.anim2 = QPropertyAnimation(self.side_panel, b"maximumWidth")
@@ -195,7 +219,7 @@ class RoomScene(QWidget):
     def on_side_anim_finished(self, target):
         '''enable scrollbar when anim finsihes'''
         if target > 0:
-            self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+            self.task_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.recenter_camera()
 
     def resizeEvent(self, event):
@@ -221,41 +245,84 @@ class RoomScene(QWidget):
 
         self.camera.centerOn(center_point)
 
-    def update_task_panel(self, user_task_list):
-        '''calears and remakes the side panel
-        input:list of object'''
-        while self.card_container_layout.count():
-            item = self.card_container_layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
-
-        card_list = []
-        for i in range(len(user_task_list)):
-            if user_task_list[i].subdivisions != 0:
-                #create a card with the subtasks
-                card = UserDivTaskCard(user_task_list[i])
-                card.update_task_status_database.connect(self.request_task_status_update.emit)
-                #cards emit signal to room scen which roomscene emits to main to do logic
-                card.update_subtask_status_database.connect(
-                    lambda status, subtask_id, taskid, c=card: 
-                    self.request_subtask_status_update.emit(c, status, subtask_id, taskid)
-                )
-                card.delete_request.connect(self.request_task_removal.emit)
-                card_list.append(card)
-            else:
-                #create a card without subtask
-                card = UserTaskCard(user_task_list[i])
-                card.update_task_status_database.connect(self.request_task_status_update.emit)
-                card.delete_request.connect(self.request_task_removal.emit)
-                card_list.append(card)
-
-        for card in card_list:
-            self.card_container_layout.addWidget(card)
-
-    def update_divtask_label(self, card, status):
+    def emit_task_search(self):
+        '''sends the search text to main once typing has paused'''
+        self.request_task_search.emit(self.search_box.text().strip())
+
+    def search_text(self):
+        '''returns the search currently applied to the side panel
+        output: str'''
+        return self.search_box.text().strip()
+
+    def clear_search(self):
+        '''empties the search box without firing a search'''
+        self.search_timer.stop()
+        self.search_box.blockSignals(True)
+        self.search_box.clear()
+        self.search_box.blockSignals(False)
+
+    def update_task_panel(self, user_task_list, more_available=False, grouped=True):
+        '''replaces the side panel rows with the first page of tasks, grouped under urgency headers unless told otherwise
+        input:list of object, bool, bool'''
+        self.task_model.set_tasks(user_task_list, more_available, grouped)
+        self.task_view.scrollToTop()
+
+    def append_tasks(self, user_task_list, more_available=False):
+        '''adds the next page of tasks under the ones already shown
+        input:list of object, bool'''
+        self.task_model.append_tasks(user_task_list, more_available)
+
+    def sync_task_panel(self, user_task_list, more_available=False):
+        '''brings the side panel in line with a fresh first page by inserting, removing and updating only the rows that differ
+        input:list of object, bool'''
+        for taskid in self.task_model.sync_tasks(user_task_list, more_available):
+            self.task_delegate.sizeHintChanged.emit(self.task_model.task_index(taskid))
+
+    def set_task_groups(self, bounds, group_counts):
+        '''updates the urgency group boundaries and the counts shown in the group headers
+        input: tuple, dict'''
+        self.task_model.set_groups(bounds, group_counts)
+
+    def insert_task(self, task):
+        '''adds one new task to the side panel'''
+        self.task_model.insert_task(task)
+
+    def remove_task(self, taskid):
+        '''drops one task from the side panel'''
+        self.task_model.remove_task(taskid)
+
+    def update_task(self, task):
+        '''repaints one task of the side panel with fresh data'''
+        if self.task_model.update_task(task):
+            self.task_delegate.sizeHintChanged.emit(self.task_model.task_index(task.taskid))
+
+    def toggle_task(self, taskid, status):
+        '''checks or unchecks a plain task and asks main to save it
+        input: int, int'''
+        self.task_model.set_task_status(taskid, status)
+        self.request_task_status_update.emit(status, taskid)
+
+    def toggle_subtask(self, taskid, subtask_id, status):
+        '''checks or unchecks a subtask and asks main to save it, the header follows once saved
+        input: int, int, int'''
+        self.task_model.set_subtask_status(taskid, subtask_id, status)
+        self.request_subtask_status_update.emit(status, subtask_id, taskid)
+
+    def find_task(self, taskid):
+        '''returns a task loaded in the side panel, None if it is not loaded
+        input: int
+        output: object or None'''
+        index = self.task_model.task_index(taskid)
+        return index.data(TASK_ROLE) if index.isValid() else None
+
+    def show_reminder(self, name):
+        '''tells the user a task's deadline has arrived
+        input: str'''
+        self.camera.show_reminder(f'⏰ Due now: {name}')
+
+    def update_divtask_label(self, taskid, status):
         '''update the strike through on the task headers'''
-        card.update_center_label(status)
+        self.task_model.set_task_status(taskid, status)
     
     def update_button_positions(self):
         '''position overlay butons on camera view'''
@@ -356,6 +423,14 @@ class Camera(QGraphicsView):
         self.money_indicator = QLabel('$0', self)
         self.money_indicator.setStyleSheet(self.styles.money_label_style())
 
+        #reminder banner, hides itself a few seconds after a deadline arrives
+        self.reminder_label = QLabel('', self)
+        self.reminder_label.setStyleSheet(self.styles.money_label_style())
+        self.reminder_label.hide()
+        self.reminder_timer = QTimer(self)
+        self.reminder_timer.setSingleShot(True)
+        self.reminder_timer.timeout.connect(self.reminder_label.hide)
+
         self.update_button_positions()
         self.settings_btn.move(self.margin, self.margin)
         self.setDragMode(QGraphicsView.DragMode.NoDrag)
@@ -370,6 +445,16 @@ class Camera(QGraphicsView):
         self.money_indicator.adjustSize()
         self.update_button_positions()
 
+    def show_reminder(self, text, duration_ms=8000):
+        '''shows the reminder banner at the top of the view for a while
+        input: str, int'''
+        self.reminder_label.setText(text)
+        self.reminder_label.adjustSize()
+        self.reminder_label.show()
+        self.reminder_label.raise_()
+        self.reminder_timer.start(duration_ms)
+        self.update_button_positions()
+
     def resizeEvent(self, event):
         '''Update overlay button position when resize'''
         super().resizeEvent(event)
@@ -385,6 +470,7 @@ class Camera(QGraphicsView):
        self.settings_btn.move(margin, margin)
        money_x = self.width() - self.money_indicator.width() - margin
        self.money_indicator.move(money_x, margin) 
+       self.reminder_label.move((self.width() - self.reminder_label.width()) // 2, margin)
     
     def mousePressEvent(self, event):
         '''override mousepress to keep curso consisten'''
@@ -396,205 +482,453 @@ class Camera(QGraphicsView):
         super().mouseReleaseEvent(event)
         self.viewport().setCursor(Qt.CursorShape.ArrowCursor)
 
-### TASK CARDS ###
-
-class UserTaskCard(QFrame):
-    ''' taks card widget for side bar'''
-    update_task_status_database = pyqtSignal(int, int)
-    delete_request = pyqtSignal(int)
-
-    def __init__(self, user_task):
-        '''constructs task card UI
-        input:object'''
-        super().__init__()
-        self.setObjectName("Card") 
-        self.setFixedSize(305, 65) 
-        self.styles = default_theme
-        
-        self.taskid = user_task.taskid
-
-        self.setStyleSheet(self.styles.task_style())
-
-        layout = QGridLayout(self)
-        layout.setSpacing(0)
-        layout.setContentsMargins(5, 2, 5, 2)
-
-        layout.setRowStretch(0, 0)
-        layout.setRowStretch(1, 1) 
-        layout.setRowStretch(2, 0)
-
-        self.reward_label = QLabel(f"${user_task.reward}")
-        self.reward_label.setStyleSheet("font-weight: bold;")
-        layout.addWidget(self.reward_label, 0, 2, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
-
-        self.checkbox = QCheckBox(f'{user_task.name}')
-        self.checkbox.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.checkbox.setChecked(True if user_task.status == 1 else False)
-        font = self.checkbox.font()
-        font.setStrikeOut(self.checkbox.isChecked())
-        self.checkbox.setFont(font)
-        layout.addWidget(self.checkbox, 1, 0, 1, 2, alignment=Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-
-        self.checkbox.toggled.connect(self.task_status_updated)
-
-        self.time_due_label = QLabel(f"{user_task.time_due}" if user_task.deadline != 0 else "")
-        self.time_due_label.setStyleSheet("padding-left: 2px;") 
-        layout.addWidget(self.time_due_label, 2, 0, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignLeft)
-
-        self.date_due_label = QLabel(f"{user_task.date_due}" if user_task.deadline != 0 else "")
-        layout.addWidget(self.date_due_label, 2, 2, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
-
-        self.delete_btn = QPushButton("✕")
-        self.delete_btn.setFixedSize(25, 25)
-        self.delete_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.delete_btn.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Expanding)
-        self.delete_btn.setStyleSheet('background-color: transparent; color: #ff6666; font-size: 18px; border: none; font-weight: 900;')
-        layout.addWidget(self.delete_btn, 1, 2,  alignment=Qt.AlignmentFlag.AlignCenter)
-
-        self.delete_btn.clicked.connect(lambda: self.delete_request.emit(self.taskid))
-
-        layout.setColumnStretch(0, 1) 
-        layout.setColumnStretch(1, 0) 
-        layout.setColumnStretch(2, 0)
-
-    def task_status_updated(self, checked):
-        '''emit signal to ubdate dtabase and strike out text
-        input: bool'''
-        self.update_task_status_database.emit(int(checked), self.taskid)
-        font = self.checkbox.font()
-        font.setStrikeOut(checked)
-        self.checkbox.setFont(font)
-
-class UserDivTaskCard(QFrame):
-    '''task card widget with subtasks'''
-    update_task_status_database = pyqtSignal(int, int)
-    update_subtask_status_database = pyqtSignal(int, int, int)
-    delete_request = pyqtSignal(int)
-
-    def __init__(self, user_task):
-        '''make task card UI
-        input: object'''
-        super().__init__()
-        self.setObjectName("Card") 
-        self.setFixedWidth(305)
-        self.styles = default_theme
-        
-        self.taskid = user_task.taskid
-        self.full_task_status = user_task.status
+### TASK LIST ###
 
-        self.setStyleSheet(self.styles.task_style())
+TASK_ROLE = Qt.ItemDataRole.UserRole + 1
+EXPANDED_ROLE = Qt.ItemDataRole.UserRole + 2
+GROUP_ROLE = Qt.ItemDataRole.UserRole + 3
+HEADER_ROLE = Qt.ItemDataRole.UserRole + 4
 
-        layout = QVBoxLayout(self)
-        layout.setSpacing(0)
-        layout.setContentsMargins(0, 0, 0, 0)
-        #fix layout to fit around children to make it shrink back down ithout space in scroll area
-        layout.setSizeConstraint(QLayout.SizeConstraint.SetFixedSize)
+def task_fields(task):
+    '''everything a card shows of a task, used to tell whether a row needs repainting'''
+    subtasks = tuple((subtask['subtask_id'], subtask['name'], subtask['status']) for subtask in task.subtasks or ())
+    return (task.name, task.status, task.reward, task.deadline, task.date_due, task.time_due, task.due_at, task.subdivisions, subtasks)
 
-        main_card_container = QWidget()
-        main_card_container.setFixedSize(305, 65)
-        main_card_layout = QGridLayout(main_card_container)
-        main_card_layout.setSpacing(0)
-        main_card_layout.setContentsMargins(5, 2, 5, 2)
+class TaskListModel(QAbstractListModel):
+    '''list model over UserTask objects, remembers which divided tasks are expanded.
+    rows arrive in urgency order so a group header goes above each row starting a new group'''
+    request_more = pyqtSignal()
 
-        main_card_layout.setRowStretch(0, 0)
-        main_card_layout.setRowStretch(1, 1) 
-        main_card_layout.setRowStretch(2, 0)
-
-        self.reward_label = QLabel(f"${user_task.reward}")
-        self.reward_label.setStyleSheet("padding-right: 5px; font-weight: bold;")
-        main_card_layout.addWidget(self.reward_label, 0, 2, alignment=Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
-
-        self.center_container = QWidget()
-        self.center_container_layout = QHBoxLayout(self.center_container)
-        self.center_container_layout.setSpacing(5)
-        self.center_container_layout.setContentsMargins(5, 0, 0, 0)
-        
-        self.menu_btn = QPushButton("►")
-        self.menu_btn.setFixedSize(18, 18)
-        self.menu_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.menu_btn.clicked.connect(self.toggle_subtask_container)
-
-        self.center_label = QLabel(f'{user_task.name}')
-        self.center_label.setStyleSheet('spacing: 8px; font-size: 14px; background: transparent; border: none; font-weight: bold;')
-        font = self.center_label.font()
-        font.setStrikeOut(bool(user_task.status))
-        self.center_label.setFont(font)
-
-        self.center_container_layout.addWidget(self.menu_btn)
-        self.center_container_layout.addWidget(self.center_label)
-        main_card_layout.addWidget(self.center_container, 1, 0, 1, 2, alignment=Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-
-        self.time_due_label = QLabel(f"{user_task.time_due}" if user_task.deadline != 0 else "")
-        self.time_due_label.setStyleSheet("padding-left: 2px;") 
-        main_card_layout.addWidget(self.time_due_label, 2, 0, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignLeft)
-
-        self.date_due_label = QLabel(f"{user_task.date_due}" if user_task.deadline != 0 else "")
-        self.date_due_label.setStyleSheet("padding-right: 5px;")
-        main_card_layout.addWidget(self.date_due_label, 2, 2, alignment=Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignRight)
-
-        self.delete_btn = QPushButton("✕")
-        self.delete_btn.setFixedWidth(25)
-        self.delete_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.delete_btn.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Expanding)
-        self.delete_btn.setStyleSheet('background-color: transparent; color: #ff6666; font-size: 18px; border: none; font-weight: 900;')
-        main_card_layout.addWidget(self.delete_btn, 1, 2,  alignment=Qt.AlignmentFlag.AlignCenter)
-
-        self.delete_btn.clicked.connect(lambda: self.delete_request.emit(self.taskid))
-
-        main_card_layout.setColumnStretch(0, 1) 
-        main_card_layout.setColumnStretch(1, 0) 
-        main_card_layout.setColumnStretch(2, 0)
-
-        self.subtasks_container = QWidget()
-        self.subtasks_container.setStyleSheet(f"background: transparent; border: none {self.styles.col_border};")
-        self.subtasks_container_layout = QVBoxLayout(self.subtasks_container)
-        self.subtasks_container_layout.setSpacing(5)
-        self.subtasks_container_layout.setContentsMargins(20, 0, 5, 10)
-        self.add_checkbox_list(user_task.subtasks)
-
-        self.subtasks_container_layout.setSizeConstraint(QLayout.SizeConstraint.SetFixedSize)
-
-        layout.addWidget(main_card_container)
-        layout.addWidget(self.subtasks_container)
-        self.subtasks_container.hide()
-        layout.addStretch()
+    def __init__(self):
+        super().__init__()
+        self.tasks = []
+        self.rows = {}
+        self.expanded = set()
+        self.more_available = False
+        self.more_requested = False
+        self.grouped = True
+        self.bounds = urgency_bounds()
+        self.group_counts = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.tasks)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.tasks):
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return task.name
+        if role == TASK_ROLE:
+            return task
+        if role == EXPANDED_ROLE:
+            return task.taskid in self.expanded
+        if role == GROUP_ROLE:
+            return urgency_group(task, self.bounds)
+        if role == HEADER_ROLE:
+            return self.group_header(index.row())
+        return None
+
+    def group_header(self, row):
+        '''returns the header text above a row that starts an urgency group, None for the other rows
+        input: int
+        output: str or None'''
+        if not self.grouped:
+            return None
+        group = urgency_group(self.tasks[row], self.bounds)
+        if row > 0 and urgency_group(self.tasks[row - 1], self.bounds) == group:
+            return None
+        count = self.group_counts.get(group)
+        return URGENCY_GROUPS[group] if count is None else f'{URGENCY_GROUPS[group]} ({count})'
+
+    def set_groups(self, bounds, group_counts):
+        '''moves the group boundaries to a new time and sets the per group task counts shown in the headers
+        input: tuple, dict'''
+        self.layoutAboutToBeChanged.emit()
+        self.bounds = bounds
+        self.group_counts = group_counts
+        self.layoutChanged.emit()
+
+    def set_tasks(self, user_task_list, more_available=False, grouped=True):
+        '''replaces every row with the first page of tasks, search results come in rank order and are shown without groups
+        input: list of object, bool, bool'''
+        self.beginResetModel()
+        self.grouped = grouped
+        self.bounds = urgency_bounds()
+        self.tasks = list(user_task_list)
+        self.rows = {task.taskid: row for row, task in enumerate(self.tasks)}
+        self.expanded &= set(self.rows)
+        self.endResetModel()
+        self.more_available = more_available
+        self.more_requested = False
+
+    def append_tasks(self, user_task_list, more_available=False):
+        '''adds the next page of tasks under the rows already loaded
+        input: list of object, bool'''
+        new_tasks = [task for task in user_task_list if task.taskid not in self.rows]
+        if new_tasks:
+            first = len(self.tasks)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_tasks) - 1)
+            for row, task in enumerate(new_tasks, start=first):
+                self.tasks.append(task)
+                self.rows[task.taskid] = row
+            self.endInsertRows()
+        self.more_available = more_available
+        self.more_requested = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more_available and not self.more_requested
+
+    def fetchMore(self, parent=QModelIndex()):
+        '''called by the view once scrolled to the end, the page arrives through append_tasks'''
+        if self.canFetchMore(parent):
+            self.more_requested = True
+            self.request_more.emit()
+
+    def task_index(self, taskid):
+        '''finds the index of a task by id
+        input: int
+        output: object'''
+        row = self.rows.get(taskid)
+        return self.index(row) if row is not None else QModelIndex()
+
+    def insert_task(self, task):
+        '''inserts a task where it belongs in the panel order, a task past the loaded rows waits for its page
+        input: object
+        output: bool'''
+        if task.taskid in self.rows:
+            self.update_task(task)
+            return True
+        key = task.page_key()
+        row = next((row for row, loaded in enumerate(self.tasks) if loaded.page_key() > key), len(self.tasks))
+        if row == len(self.tasks) and self.more_available:
+            return False
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.tasks.insert(row, task)
+        self.reindex(row)
+        self.endInsertRows()
+        return True
+
+    def remove_task(self, taskid):
+        '''removes a task's row if it is loaded
+        input: int'''
+        row = self.rows.get(taskid)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.tasks[row]
+        del self.rows[taskid]
+        self.expanded.discard(taskid)
+        self.reindex(row)
+        self.endRemoveRows()
+
+    def update_task(self, task):
+        '''swaps in fresh data for a loaded task in place, returns whether anything visible changed
+        input: object
+        output: bool'''
+        row = self.rows.get(task.taskid)
+        if row is None or task_fields(self.tasks[row]) == task_fields(task):
+            return False
+        self.tasks[row] = task
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [TASK_ROLE])
+        self.reposition(task.taskid)
+        return True
+
+    def reposition(self, taskid):
+        '''moves a task whose status or deadline changed to its place in the panel order, returns whether it moved
+        input: int
+        output: bool'''
+        row = self.rows.get(taskid)
+        if row is None or not self.grouped:
+            return False
+        task = self.tasks[row]
+        key = task.page_key()
+        if (row == 0 or self.tasks[row - 1].page_key() < key) and (row == len(self.tasks) - 1 or key < self.tasks[row + 1].page_key()):
+            return False
+        expanded = taskid in self.expanded
+        self.remove_task(taskid)
+        #a task moving past the loaded rows is left for its page to bring back
+        if self.insert_task(task) and expanded:
+            self.expanded.add(taskid)
+        return True
+
+    def sync_tasks(self, user_task_list, more_available=False):
+        '''applies the difference between the loaded rows and a fresh first page instead of resetting,
+        returns the taskids whose rows changed in place
+        input: list of object, bool
+        output: list'''
+        fresh = {task.taskid: task for task in user_task_list}
+        #rows past the fresh page are left alone, they belong to later pages
+        last_key = user_task_list[-1].page_key() if user_task_list and more_available else None
+        for task in list(self.tasks):
+            if task.taskid not in fresh and (last_key is None or task.page_key() <= last_key):
+                self.remove_task(task.taskid)
+
+        changed = []
+        for task in user_task_list:
+            if task.taskid in self.rows:
+                if self.update_task(task):
+                    changed.append(task.taskid)
+            else:
+                self.insert_task(task)
+        self.more_available = more_available or self.more_available
+        self.more_requested = False
+        return changed
+
+    def reindex(self, first_row):
+        '''refreshes the taskid to row map from a row onward after rows shifted'''
+        for row in range(first_row, len(self.tasks)):
+            self.rows[self.tasks[row].taskid] = row
+
+    def toggle_expanded(self, taskid):
+        '''expands or collapses a divided task'''
+        if taskid in self.expanded:
+            self.expanded.discard(taskid)
+        else:
+            self.expanded.add(taskid)
+        index = self.task_index(taskid)
+        self.dataChanged.emit(index, index, [EXPANDED_ROLE])
+
+    def set_task_status(self, taskid, status):
+        '''updates a task's status and repaints its row
+        input: int, int'''
+        index = self.task_index(taskid)
+        if not index.isValid():
+            return
+        self.tasks[index.row()].status = status
+        if not self.reposition(taskid):
+            self.dataChanged.emit(index, index, [TASK_ROLE])
+
+    def set_subtask_status(self, taskid, subtask_id, status):
+        '''updates one subtask's status and repaints its row
+        input: int, int, int'''
+        index = self.task_index(taskid)
+        if not index.isValid():
+            return
+        for subtask in self.tasks[index.row()].subtasks or ():
+            if subtask['subtask_id'] == subtask_id:
+                subtask['status'] = status
+        self.dataChanged.emit(index, index, [TASK_ROLE])
+
+class TaskCardDelegate(QStyledItemDelegate):
+    '''paints tasks as cards and turns clicks on their parts into signals, no widgets are made per task'''
+    task_toggled = pyqtSignal(int, int)
+    subtask_toggled = pyqtSignal(int, int, int)
+    expand_toggled = pyqtSignal(int)
+    delete_clicked = pyqtSignal(int)
+
+    card_width = 305
+    card_height = 65
+    row_spacing = 10
+    subtask_height = 22
+    subtask_spacing = 5
+    header_height = 24
+
+    def __init__(self, styles, parent=None):
+        super().__init__(parent)
+        self.styles = styles
 
-    def add_checkbox_list(self, subtask_list):
-        '''Iterates thru subtask list and makes checkboxes
-        input: list of dict'''
-        for subtask in subtask_list:
-            checkbox = QCheckBox(f"{subtask['name']}")
-            checkbox.setCursor(Qt.CursorShape.PointingHandCursor)
-            checkbox.setChecked(True if subtask['status'] == 1 else False)
-            font = checkbox.font()
-            font.setStrikeOut(checkbox.isChecked())
-            checkbox.setFont(font)
-            #we have ti do subtask id = subtask otherwise it will take the value when the button is clicked
-            checkbox.toggled.connect(
-                lambda checked, subtask_id=subtask['subtask_id'], chk = checkbox: 
-                self.subtask_status_updated(checked, subtask_id, chk)
-                )
-            self.subtasks_container_layout.addWidget(checkbox)
-        self.subtasks_container_layout.addStretch()
-
-    def subtask_status_updated(self, checked, subtask_id, checkbox):
-        '''emit signal for subtask to strike through the text'''
-        self.update_subtask_status_database.emit(int(checked), subtask_id, self.taskid)
-        font = checkbox.font()
-        font.setStrikeOut(checked)
-        checkbox.setFont(font)
-
-    def update_center_label(self, status):
-        '''Update main subtask if all task are complete'''
-        font = self.center_label.font()
-        font.setStrikeOut(bool(status))
-        self.center_label.setFont(font)
-
-    def toggle_subtask_container(self):
-        '''expand, collapse subtask list view'''
-        if self.subtasks_container.isVisible():
-            self.menu_btn.setText('►')
-            self.subtasks_container.hide()
+    def sizeHint(self, option, index):
+        task = index.data(TASK_ROLE)
+        height = self.card_height + self.row_spacing
+        if task is not None and task.subtasks and index.data(EXPANDED_ROLE):
+            height += len(task.subtasks) * (self.subtask_height + self.subtask_spacing) + 10
+        if index.data(HEADER_ROLE):
+            height += self.header_height
+        return QSize(self.card_width, height)
+
+    def card_rect(self, rect, index):
+        '''the part of a row below its group header, if it has one
+        input: object, object
+        output: object'''
+        if index.data(HEADER_ROLE):
+            return rect.adjusted(0, self.header_height, 0, 0)
+        return rect
+
+    def card_parts(self, rect, task, expanded):
+        '''lays out the rects of a card, shared by painting and hit testing
+        input: object, object, bool
+        output: dict'''
+        height = self.card_height
+        if task.subtasks and expanded:
+            height += len(task.subtasks) * (self.subtask_height + self.subtask_spacing) + 10
+        card = QRect(rect.x() + max(0, (rect.width() - self.card_width) // 2), rect.y() + self.row_spacing // 2, self.card_width, height)
+        inner = QRect(card.x(), card.y(), self.card_width, self.card_height).adjusted(5, 2, -5, -2)
+        middle = inner.center().y()
+
+        parts = {'card': card}
+        parts['reward'] = QRect(inner.x(), inner.y(), inner.width() - 5, 14)
+        parts['due'] = QRect(inner.x() + 2, inner.bottom() - 13, inner.width() - 7, 14)
+        parts['delete'] = QRect(inner.right() - 30, middle - 12, 25, 25)
+        parts['box'] = QRect(inner.x() + 5, middle - 9, 18, 18)
+        parts['name'] = QRect(parts['box'].right() + 8, middle - 12, parts['delete'].left() - parts['box'].right() - 13, 25)
+        #like a checkbox the whole label toggles a plain task
+        parts['check'] = parts['box'].united(parts['name'])
+
+        parts['subtasks'] = []
+        if task.subtasks and expanded:
+            y = card.y() + self.card_height
+            for subtask in task.subtasks:
+                row = QRect(card.x() + 20, y, self.card_width - 25, self.subtask_height)
+                parts['subtasks'].append((row, subtask))
+                y += self.subtask_height + self.subtask_spacing
+        return parts
+
+    def hit_test(self, rect, task, expanded, pos):
+        '''names the part of a card under a point
+        input: object, object, bool, object
+        output: tuple or None'''
+        parts = self.card_parts(rect, task, expanded)
+        if parts['delete'].contains(pos):
+            return ('delete', None)
+        if task.subdivisions != 0:
+            if parts['box'].contains(pos):
+                return ('expand', None)
+            for row, subtask in parts['subtasks']:
+                if row.contains(pos):
+                    return ('subtask', subtask)
+        elif parts['check'].contains(pos):
+            return ('check', None)
+        return None
+
+    def paint(self, painter, option, index):
+        task = index.data(TASK_ROLE)
+        if task is None:
+            return
+        parts = self.card_parts(self.card_rect(option.rect, index), task, index.data(EXPANDED_ROLE))
+        text_col = QColor(self.styles.col_text)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        header = index.data(HEADER_ROLE)
+        if header:
+            header_font = QFont(option.font)
+            header_font.setPixelSize(12)
+            header_font.setWeight(QFont.Weight.Black)
+            painter.setFont(header_font)
+            painter.setPen(text_col)
+            header_rect = QRect(option.rect.x() + 10, option.rect.y() + 4, option.rect.width() - 20, self.header_height - 4)
+            painter.drawText(header_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignBottom, header.upper())
+
+        painter.setPen(QPen(QColor(self.styles.col_border), 2))
+        painter.setBrush(QColor(self.styles.col_secondary))
+        painter.drawRoundedRect(QRectF(parts['card']).adjusted(1, 1, -1, -1), 10, 10)
+
+        small = QFont(option.font)
+        small.setPixelSize(9)
+        painter.setPen(text_col)
+        painter.setFont(small)
+        if task.deadline != 0:
+            #overdue deadlines in red
+            painter.setPen(QColor('#ff6666') if index.data(GROUP_ROLE) == 0 else text_col)
+            painter.drawText(parts['due'], Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignBottom, f'{task.time_due}')
+            painter.drawText(parts['due'], Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom, f'{task.date_due}')
+        small.setBold(True)
+        painter.setFont(small)
+        painter.setPen(text_col)
+        #imported tasks show a placeholder until their reward is priced
+        reward = '…' if task.reward is None else task.reward
+        painter.drawText(parts['reward'], Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop, f'${reward}')
+
+        if task.subdivisions != 0:
+            #expand button in place of the checkbox
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(text_col)
+            painter.drawRect(parts['box'])
+            painter.setPen(QColor('white'))
+            painter.drawText(parts['box'], Qt.AlignmentFlag.AlignCenter, '▼' if index.data(EXPANDED_ROLE) else '►')
+        else:
+            self.paint_checkbox(painter, parts['box'], task.status == 1)
+
+        name_font = QFont(option.font)
+        name_font.setPixelSize(14)
+        name_font.setBold(task.subdivisions != 0)
+        name_font.setStrikeOut(task.status == 1)
+        painter.setFont(name_font)
+        painter.setPen(text_col)
+        name = painter.fontMetrics().elidedText(task.name, Qt.TextElideMode.ElideRight, parts['name'].width())
+        painter.drawText(parts['name'], Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, name)
+
+        delete_font = QFont(option.font)
+        delete_font.setPixelSize(18)
+        delete_font.setWeight(QFont.Weight.Black)
+        painter.setFont(delete_font)
+        painter.setPen(QColor('#ff6666'))
+        painter.drawText(parts['delete'], Qt.AlignmentFlag.AlignCenter, '✕')
+
+        subtask_font = QFont(option.font)
+        subtask_font.setPixelSize(14)
+        for row, subtask in parts['subtasks']:
+            box = QRect(row.x(), row.center().y() - 8, 16, 16)
+            self.paint_checkbox(painter, box, subtask['status'] == 1)
+            subtask_font.setStrikeOut(subtask['status'] == 1)
+            painter.setFont(subtask_font)
+            painter.setPen(text_col)
+            label = row.adjusted(box.width() + 8, 0, 0, 0)
+            text = painter.fontMetrics().elidedText(f"{subtask['name']}", Qt.TextElideMode.ElideRight, label.width())
+            painter.drawText(label, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, text)
+
+        painter.restore()
+
+    def paint_checkbox(self, painter, rect, checked):
+        '''draws a checkbox in the task style'''
+        border = QColor('#4CAF50') if checked else QColor(self.styles.col_border)
+        painter.setPen(QPen(border, 2))
+        painter.setBrush(QColor('#4CAF50') if checked else QColor(self.styles.col_primary))
+        painter.drawRoundedRect(QRectF(rect).adjusted(1, 1, -1, -1), 4, 4)
+
+    def editorEvent(self, event, model, option, index):
+        '''routes clicks on a card's checkbox, subtasks, expand button and delete button'''
+        if event.type() != QEvent.Type.MouseButtonRelease or event.button() != Qt.MouseButton.LeftButton:
+            return False
+        task = index.data(TASK_ROLE)
+        if task is None:
+            return False
+        hit = self.hit_test(self.card_rect(option.rect, index), task, index.data(EXPANDED_ROLE), event.position().toPoint())
+        if hit is None:
+            return False
+
+        part, subtask = hit
+        if part == 'delete':
+            self.delete_clicked.emit(task.taskid)
+        elif part == 'expand':
+            self.expand_toggled.emit(task.taskid)
+            self.sizeHintChanged.emit(index)
+        elif part == 'check':
+            self.task_toggled.emit(task.taskid, 0 if task.status == 1 else 1)
+        elif part == 'subtask':
+            self.subtask_toggled.emit(task.taskid, subtask['subtask_id'], 0 if subtask['status'] == 1 else 1)
+        return True
+
+class TaskListView(QListView):
+    '''side panel task list, rows are painted by the delegate so only what is on screen costs anything'''
+    def __init__(self, model, delegate, styles):
+        super().__init__()
+        self.setModel(model)
+        self.setItemDelegate(delegate)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setMouseTracking(True)
+        self.setStyleSheet(styles.scrollbar_style() + 'QListView { background: transparent; border: none; }')
+
+    def mouseMoveEvent(self, event):
+        '''pointing hand over anything clickable on a card'''
+        super().mouseMoveEvent(event)
+        pos = event.position().toPoint()
+        index = self.indexAt(pos)
+        task = index.data(TASK_ROLE) if index.isValid() else None
+        hit = None
+        if task is not None:
+            delegate = self.itemDelegate()
+            hit = delegate.hit_test(delegate.card_rect(self.visualRect(index), index), task, index.data(EXPANDED_ROLE), pos)
+        if hit is None:
+            self.viewport().unsetCursor()
         else:
-            self.menu_btn.setText('▼')
-            self.subtasks_container.show()
\ No newline at end of file
+            self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
@@ -1,4 +1,6 @@
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QStackedWidget)
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QStackedWidget, QMessageBox, QProgressDialog)
+from PyQt6.QtCore import pyqtSignal, QTimer
+import sqlite3
 import sys
 
 # Import your modules
@@ -9,7 +11,10 @@ from store_utils import GameData, default_theme
 from clothing_store import ClothingView
 from furniture_store import FurnitureView
 from task_page import TaskEntryWidget
-from task_handler import TaskDataHandler
+from task_handler import TaskDataHandler, ai_engine
+from reminders import ReminderScheduler
+from task_import import TaskImporter, ImportWorker
+from enrichment import EnrichmentWorker
 
 # Initialize user id global variable as well as database manager, user manager and task handler objects
 uuid = None
@@ -19,6 +24,12 @@ task_handler = TaskDataHandler()
 
 def main():
     class MainWindow(QMainWindow):
+        # Signals emitted from the database writer thread, delivered on the GUI thread
+        reward_claimed = pyqtSignal(object)
+        divtask_status_saved = pyqtSignal(int, int, object)
+        persistence_failed = pyqtSignal(str)
+        ai_model_ready = pyqtSignal(bool)
+
         def __init__(self):
             super().__init__()
             
@@ -27,6 +38,19 @@ def main():
             self.setMinimumSize(300, 310)            
 
             self.game_data = GameData()
+            self.shown_tasks = None
+            self.task_page_after = None
+            self.reminders = ReminderScheduler(self)
+            self.reminders.task_due.connect(self.remind_task_due)
+            self.import_worker = None
+            self.import_progress = None
+            self.enricher = EnrichmentWorker(ai_engine, task_handler, self)
+            self.enricher.enriched.connect(self.finish_enrichment)
+            self.enricher.enrichment_failed.connect(self.fail_enrichment)
+            self.enricher.model_unavailable.connect(self.stop_enrichment)
+            self.enricher.queue_empty.connect(self.queue_unpriced_tasks)
+            self.enrich_backlog = False
+            self.enrich_skipped = set()
                       
             # Create pages
             self.login_page = LoginPage()
@@ -58,57 +82,77 @@ def main():
             self.clothing_view.request_home_view.connect(self.switch_to_home)
             self.clothing_view.request_furniture_view.connect(self.switch_to_furniture)
             self.clothing_view.money_changed.connect(self.sync_views)
+            self.clothing_view.purchase_completed.connect(self.record_purchase)
             
             # Connect from furniture to home and clothing
             self.furniture_view.request_home_view.connect(self.switch_to_home)
             self.furniture_view.request_clothing_view.connect(self.switch_to_clothing)
             self.furniture_view.money_changed.connect(self.sync_views)
+            self.furniture_view.purchase_completed.connect(self.record_purchase)
 
             # Connect from task entry to home
             self.task_entry.request_main_page.connect(self.switch_to_home)
             
             # Link task manager and task entry page
-            self.task_entry.task_ready_signal.connect(task_handler.task_insertion)
+            self.task_entry.task_ready_signal.connect(self.add_task)
+            self.task_entry.import_file_signal.connect(self.import_tasks)
 
             # Signal requesting change to tasks
             self.home_page.request_task_status_update.connect(self.update_task_status)
             self.home_page.request_subtask_status_update.connect(self.update_divtask_status)
             self.home_page.request_task_removal.connect(self.remove_and_update_tasks)
+            self.home_page.request_more_tasks.connect(self.load_more_tasks)
+            self.home_page.request_task_search.connect(self.search_tasks)
 
             # Save data signals
             self.furniture_view.request_save_layout.connect(self.save_furniture_data)
             self.clothing_view.checkout_completed.connect(self.save_clothe_data)
+
+            # Results and failures of queued database writes
+            self.reward_claimed.connect(self.finish_task_status)
+            self.divtask_status_saved.connect(self.finish_divtask_status)
+            self.persistence_failed.connect(self.show_persistence_error)
+            self.ai_model_ready.connect(self.task_entry.set_model_status)
+            db.set_write_error_handler(
+                lambda key, error: self.persistence_failed.emit(f'Could not save {key[0]} changes: {error}')
+            )
             
             self.setCentralWidget(self.pages)
             
         
-        def init_game_data(self, current_uuid):
-            '''Initializes game data based of given user ID
+        def start_model_warmup(self):
+            '''Starts loading the AI model in the background, the task entry page is told once it is ready
 
-            Input: int
+            Input: None
             Output: None'''
-            inv_furn_list, eqp_furn_list = user_man.retrieve_user_furniture_data(current_uuid)
-            self.game_data.inventory_furniture = inv_furn_list
-            self.game_data.placed_furniture = eqp_furn_list
-            self.game_data.money = user_man.retrive_user_money(current_uuid)
-            self.furniture_view.load_layout(eqp_furn_list)
+            ai_engine.on_ready(self.ai_model_ready.emit)
+
+        def init_game_data(self, snapshot):
+            '''Initializes game data from a user's loaded snapshot
+
+            Input: object
+            Output: None'''
+            self.game_data.inventory_furniture = snapshot.inventory_furniture
+            self.game_data.placed_furniture = snapshot.placed_furniture
+            self.game_data.removed_furniture = []
+            self.game_data.money = snapshot.money
+            self.furniture_view.load_layout(snapshot.placed_furniture)
     
-            inv_clothes_list, eqp_clothes_dict = user_man.retrieve_user_clothe_data(current_uuid)
-            self.game_data.inventory_clothes = inv_clothes_list
-            self.game_data.equipped_clothes = eqp_clothes_dict
+            self.game_data.inventory_clothes = snapshot.inventory_clothes
+            self.game_data.equipped_clothes = snapshot.equipped_clothes
             self.clothing_view.update_clothes_data(self.game_data)
             self.clothing_view.refresh_page()
 
             self.sync_views()
             pass
 
-        def save_furniture_data(self, inventory_furniture, placed_furniture):
+        def save_furniture_data(self, inventory_furniture, placed_furniture, removed_furniture):
             '''Saves user furniture data to their uuid
 
-            Input: list, list
+            Input: list, list, list
             Output: None'''
             global uuid
-            user_man.save_user_furniture_data(uuid, inventory_furniture, placed_furniture)
+            user_man.save_user_furniture_data(uuid, inventory_furniture, placed_furniture, removed_furniture)
 
         def save_clothe_data(self, inventory_clothes, equipped_clothes):
             '''Saves user clothe data to their uuid
@@ -118,6 +162,14 @@ def main():
             global uuid
             user_man.save_user_clothe_data(uuid, inventory_clothes, equipped_clothes)
         
+        def record_purchase(self, item_name, item_type, price):
+            '''Records a store purchase in the user's money ledger
+
+            Input: str, str, int
+            Output: None'''
+            global uuid
+            user_man.record_purchase(uuid, item_name, item_type, price)
+        
         def login(self, current_uuid):
             '''Login sequence initializing app using user data from database
 
@@ -125,9 +177,13 @@ def main():
             Output: None'''
             global uuid
             uuid = current_uuid
-            self.update_tasks()
+            snapshot = user_man.load_user_snapshot(current_uuid)
+            self.show_first_task_page(snapshot.tasks)
+            self.reminders.load(task_handler.query_upcoming_deadlines(current_uuid))
+            self.enrich_backlog = True
+            self.queue_unpriced_tasks()
             self.setWindowTitle('Tikkit')
-            self.init_game_data(current_uuid)
+            self.init_game_data(snapshot)
             self.sync_views()
             self.setMinimumSize(1280, 720)
             self.resize(1280, 720)
@@ -181,57 +237,273 @@ def main():
             self.furniture_view.refresh_page(self.game_data)
             self.home_page.refresh_view(self.game_data)
 
+        def add_task(self, task_specs):
+            '''Inserts a new task and adds just its row to the task panel
+
+            Input: object
+            Output: None'''
+            try:
+                taskid = task_handler.task_insertion(task_specs)
+            except sqlite3.Error as e:
+                self.persistence_failed.emit(f'Could not save task {task_specs.name!r}: {e}')
+                return
+            if task_specs.reward is None:
+                self.enricher.submit(taskid, task_specs.name, task_specs.subdivisions)
+            for user_task in task_handler.query_tasks(task_specs.uuid, [taskid]):
+                self.reminders.track(user_task)
+                # While a search is shown the new task only appears once the search is cleared
+                if not self.home_page.search_text():
+                    self.home_page.insert_task(user_task)
+            self.refresh_task_groups()
+
+        def import_tasks(self, path):
+            '''Imports a CSV or iCalendar file of tasks on a background thread, showing its progress
+
+            Input: str
+            Output: None'''
+            global uuid
+            if uuid is None or self.import_worker is not None:
+                return
+            self.import_worker = ImportWorker(TaskImporter(task_handler), path, uuid, self)
+            self.import_progress = QProgressDialog('Importing tasks...', 'Cancel', 0, 1000, self)
+            self.import_progress.setWindowTitle('Tikkit')
+            self.import_progress.setMinimumDuration(300)
+            self.import_progress.canceled.connect(self.import_worker.requestInterruption)
+            self.import_worker.progress.connect(self.show_import_progress)
+            self.import_worker.import_finished.connect(self.finish_import)
+            self.import_worker.import_failed.connect(self.fail_import)
+            self.import_worker.finished.connect(self.end_import)
+            self.import_worker.start()
+
+        def show_import_progress(self, rows_read, fraction):
+            '''Moves the import progress bar
+
+            Input: int, float
+            Output: None'''
+            self.import_progress.setLabelText(f'Importing tasks... {rows_read} rows read')
+            self.import_progress.setValue(int(fraction * 1000))
+
+        def finish_import(self, result):
+            '''Reloads the task panel and reminders with the imported tasks and sums up the import
+
+            Input: object
+            Output: None'''
+            global uuid
+            if uuid is not None:
+                self.show_first_task_page(task_handler.query_user_task_page(uuid))
+                self.reminders.load(task_handler.query_upcoming_deadlines(uuid))
+                self.queue_unpriced_tasks()
+            summary = f'Imported {result.inserted} tasks, skipped {result.duplicates} already added and {result.invalid} invalid rows.'
+            if result.cancelled:
+                summary = 'Import cancelled. ' + summary
+            if result.errors:
+                summary += '\n\n' + '\n'.join(result.errors)
+            QMessageBox.information(self, 'Tikkit', summary)
+
+        def fail_import(self, message):
+            '''Tells the user a task file could not be imported
+
+            Input: str
+            Output: None'''
+            QMessageBox.warning(self, 'Tikkit', f'Could not import tasks: {message}')
+
+        def end_import(self):
+            '''Closes the progress dialog and lets the worker go once its thread has stopped
+
+            Input: None
+            Output: None'''
+            self.import_progress.reset()
+            self.import_progress.deleteLater()
+            self.import_worker.deleteLater()
+            self.import_progress = None
+            self.import_worker = None
+
+        def finish_enrichment(self, taskid, reward, subtasks):
+            '''Saves a task's AI reward and steps and repaints its card, a task completed while waiting is paid now
+
+            Input: int, int, dict
+            Output: None'''
+            global uuid
+            task_uuid, claimed = task_handler.apply_enrichment(taskid, reward, subtasks)
+            if task_uuid is None or task_uuid != uuid:
+                return
+            for user_task in task_handler.query_tasks(uuid, [taskid]):
+                self.home_page.update_task(user_task)
+            if claimed:
+                self.garnt_user_reward(claimed)
+
+        def fail_enrichment(self, taskid, message):
+            '''Tells the user a task could not be priced or planned, a task left unpriced is not queued again this session
+
+            Input: int, str
+            Output: None'''
+            self.enrich_skipped.add(taskid)
+            self.persistence_failed.emit(message)
+
+        def stop_enrichment(self, message):
+            '''Stops pricing older tasks when the AI model could not be loaded, so it is not retried for each of them,
+            new tasks keep their pending reward
+
+            Input: str
+            Output: None'''
+            self.enrich_backlog = False
+            self.task_entry.set_model_status(False)
+
+        def queue_unpriced_tasks(self):
+            '''Queues the next few of the user's tasks still waiting for a reward, such as imported ones, behind any new tasks
+
+            Input: None
+            Output: None'''
+            global uuid
+            if uuid is None or not self.enrich_backlog:
+                return
+            for taskid, name, steps in task_handler.query_unpriced_tasks(uuid, exclude=self.enrich_skipped):
+                self.enricher.submit(taskid, name, steps, EnrichmentWorker.BACKLOG)
+
         def remove_and_update_tasks(self, taskid):
-            '''Removes task
+            '''Removes task and just its row from the task panel
 
             Input: int
             Output: None'''
             task_handler.task_deletion(taskid)
-            self.update_tasks()
+            self.reminders.cancel(taskid)
+            self.home_page.remove_task(taskid)
+            self.refresh_task_groups()
 
         def update_tasks(self):
-            '''Refreshes task panel
+            '''Brings task panel in line with the database, only rows that differ are touched
 
             Input: None
             Output: None'''
             global uuid
-            user_task_list = task_handler.query_user_tasks(uuid)
-            self.home_page.update_task_panel(user_task_list)
+            if self.home_page.search_text():
+                return
+            user_task_list = task_handler.query_user_task_page(uuid)
+            # A cache hit hands back the page already on screen, so there is nothing to compare
+            if user_task_list is self.shown_tasks:
+                return
+            self.shown_tasks = user_task_list
+            self.home_page.sync_task_panel(user_task_list, len(user_task_list) >= task_handler.task_page_size)
+            self.refresh_task_groups()
 
-        def update_divtask_status(self, card, status, subtask_id, taskid):
-            '''Updates divided task's status and attempts reward grant
+        def search_tasks(self, text):
+            '''Shows the tasks matching a search in the task panel, an empty search brings back the normal pages
 
-            Input: object, int, int, int
+            Input: str
             Output: None'''
-            task_handler.subtask_update_status(status, subtask_id)
-            try:
-                divtask_status, grant_status, reward = task_handler.query_divtask_status(taskid)
-                self.garnt_user_reward(grant_status, reward, taskid)
-            except:
-                divtask_status = task_handler.query_divtask_status(taskid)
-            finally:
-                self.home_page.update_divtask_label(card, divtask_status)
+            global uuid
+            if uuid is None:
+                return
+            if not text:
+                self.show_first_task_page(task_handler.query_user_task_page(uuid))
+                return
+            self.shown_tasks = None
+            self.task_page_after = None
+            self.home_page.update_task_panel(task_handler.search_tasks(uuid, text), grouped=False)
 
-        def update_task_status(self, status, taskid):
-            '''Updates task's status and attempts reward grant
+        def show_first_task_page(self, user_task_list):
+            '''Rebuilds task panel from the first page of tasks, later pages load as it is scrolled
 
-            Input: int, int
+            Input: list
             Output: None'''
-            try:
-                grant_status, reward = task_handler.task_update_status(status, taskid)
-                self.garnt_user_reward(grant_status, reward, taskid)
-            finally:
+            self.shown_tasks = user_task_list
+            self.task_page_after = user_task_list[-1].page_key() if user_task_list else None
+            self.home_page.update_task_panel(user_task_list, len(user_task_list) >= task_handler.task_page_size)
+            self.refresh_task_groups()
+
+        def refresh_task_groups(self):
+            '''Recounts the user's tasks per urgency group for the task panel headers
+
+            Input: None
+            Output: None'''
+            global uuid
+            if uuid is None:
+                return
+            bounds = urgency_bounds()
+            self.home_page.set_task_groups(bounds, task_handler.count_tasks_by_urgency(uuid, bounds))
+
+        def load_more_tasks(self):
+            '''Appends the next page of tasks to the task panel
+
+            Input: None
+            Output: None'''
+            global uuid
+            if uuid is None or self.task_page_after is None:
                 return
+            user_task_list = task_handler.query_user_task_page(uuid, after=self.task_page_after)
+            if user_task_list:
+                self.task_page_after = user_task_list[-1].page_key()
+            self.home_page.append_tasks(user_task_list, len(user_task_list) >= task_handler.task_page_size)
 
-        def garnt_user_reward(self, grant_status, reward, taskid):
-            '''Grants user task reward if first completion
+        def update_divtask_status(self, status, subtask_id, taskid):
+            '''Queues divided task's subtask status, the parent status and reward arrive once written
 
             Input: int, int, int
             Output: None'''
-            if grant_status == 0:
-                task_handler.update_task_grant_status(taskid)
+            task_handler.queue_subtask_status(
+                status, subtask_id, taskid,
+                on_done=lambda result, t=taskid: self.divtask_status_saved.emit(t, *result)
+            )
+
+        def finish_divtask_status(self, taskid, divtask_status, reward):
+            '''Applies a written subtask change to its task row and grants any claimed reward
+
+            Input: int, int, int
+            Output: None'''
+            # Rows no longer loaded in the panel are skipped by the model
+            self.home_page.update_divtask_label(taskid, divtask_status)
+            self.track_reminder(taskid)
+            self.refresh_task_groups()
+            self.garnt_user_reward(reward)
+
+        def finish_task_status(self, reward):
+            '''Recounts the task groups once a status change is written and grants any claimed reward
+
+            Input: int
+            Output: None'''
+            self.refresh_task_groups()
+            self.garnt_user_reward(reward)
+
+        def update_task_status(self, status, taskid):
+            '''Queues task's status, any claimed reward arrives once written
+
+            Input: int, int
+            Output: None'''
+            task_handler.queue_task_status(status, taskid, on_done=self.reward_claimed.emit)
+            self.track_reminder(taskid)
+
+        def track_reminder(self, taskid):
+            '''Brings a task's deadline reminder in line with its status as shown in the task panel
+
+            Input: int
+            Output: None'''
+            user_task = self.home_page.find_task(taskid)
+            if user_task is not None:
+                self.reminders.track(user_task)
+
+        def remind_task_due(self, taskid, name):
+            '''Shows a reminder for a task whose deadline has arrived
+
+            Input: int, str
+            Output: None'''
+            self.home_page.show_reminder(name)
+            QApplication.alert(self)
+
+        def garnt_user_reward(self, reward):
+            '''Grants user a task reward claimed on first completion, the ledger already holds it
+
+            Input: int
+            Output: None'''
+            if reward:
                 self.game_data.money += reward
             self.sync_views()
+
+        def show_persistence_error(self, message):
+            '''Tells the user a queued write could not be saved
+
+            Input: str
+            Output: None'''
+            QMessageBox.warning(self, 'Tikkit', message)
         
         def logout(self):
             '''Logout sequence initializing app for next user
@@ -241,12 +513,18 @@ def main():
             self.setWindowTitle('Tikkit - Login')
             global uuid
             user_man.logout(uuid)
-            user_man.save_user_money(uuid, self.game_data.money)
             self.furniture_view.clear_room_area()
+            self.home_page.clear_search()
             self.home_page.refresh_view(GameData())
             self.setMinimumSize(350, 310) 
             self.resize(350, 310)
             self.pages.setCurrentIndex(0)
+            self.shown_tasks = None
+            self.task_page_after = None
+            self.reminders.clear()
+            self.enricher.clear()
+            self.enrich_backlog = False
+            self.enrich_skipped.clear()
             uuid = None
         
         def closeEvent(self, event):
@@ -255,9 +533,13 @@ def main():
             Input: object
             Output: None'''
             global uuid
+            if self.import_worker is not None:
+                self.import_worker.requestInterruption()
+                self.import_worker.wait()
+            self.enricher.stop()
             if uuid:
                 user_man.logout(uuid)
-                user_man.save_user_money(uuid, self.game_data.money)
+            db.close_connections()
             return super().closeEvent(event)
         
     ### Intialize App and Window ###
@@ -265,6 +547,8 @@ def main():
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # A zero timer fires once the events queued by show, including the first paint, are handled
+    QTimer.singleShot(0, window.start_model_warmup)
     sys.exit(app.exec())
 
 if __name__ == '__main__':
@@ -0,0 +1,244 @@
+import sqlite3
+
+### Ordered schema migrations, the position in the list is the schema version it produces ###
+MIGRATIONS = [
+    # 1: rebuild child tables so their foreign keys cascade on delete
+    '''
+    CREATE TABLE tasks_new (
+        uuid INTEGER REFERENCES users (uuid) ON DELETE CASCADE,
+        taskid INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+        name TEXT,
+        status INTEGER (1) DEFAULT (0),
+        subdivisions INTEGER DEFAULT (0),
+        deadline INTEGER (1) DEFAULT (0),
+        time_due TEXT,
+        date_due TEXT,
+        reward INTEGER DEFAULT (0),
+        grant_status INTEGER (1) DEFAULT (0)
+    );
+    INSERT INTO tasks_new (uuid, taskid, name, status, subdivisions, deadline, time_due, date_due, reward, grant_status)
+        SELECT uuid, taskid, name, status, subdivisions, deadline, time_due, date_due, reward, grant_status FROM tasks;
+    UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence WHERE name = 'tasks') WHERE name = 'tasks_new';
+    DROP TABLE tasks;
+    ALTER TABLE tasks_new RENAME TO tasks;
+
+    CREATE TABLE subtasks_new (
+        parent_id INTEGER REFERENCES tasks (taskid) ON DELETE CASCADE,
+        subtask_id INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE NOT NULL,
+        subtask_order INTEGER,
+        name TEXT,
+        status INTEGER (1) DEFAULT (0)
+    );
+    INSERT INTO subtasks_new (parent_id, subtask_id, subtask_order, name, status)
+        SELECT parent_id, subtask_id, subtask_order, name, status FROM subtasks;
+    UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence WHERE name = 'subtasks') WHERE name = 'subtasks_new';
+    DROP TABLE subtasks;
+    ALTER TABLE subtasks_new RENAME TO subtasks;
+
+    CREATE TABLE inventory_new (
+        item_id INTEGER PRIMARY KEY UNIQUE NOT NULL,
+        uuid INTEGER REFERENCES users (uuid) ON DELETE CASCADE NOT NULL,
+        item_name TEXT NOT NULL,
+        item_type TEXT NOT NULL,
+        ownership INTEGER DEFAULT (0),
+        quantity INTEGER NOT NULL DEFAULT (0)
+    );
+    INSERT INTO inventory_new (item_id, uuid, item_name, item_type, ownership, quantity)
+        SELECT item_id, uuid, item_name, item_type, ownership, quantity FROM inventory;
+    DROP TABLE inventory;
+    ALTER TABLE inventory_new RENAME TO inventory;
+
+    CREATE TABLE placed_furniture_new (
+        item_id INTEGER PRIMARY KEY NOT NULL UNIQUE,
+        uuid INTEGER REFERENCES users (uuid) ON DELETE CASCADE NOT NULL,
+        name TEXT NOT NULL,
+        angle_index INTEGER NOT NULL,
+        x INTEGER NOT NULL,
+        y INTEGER NOT NULL,
+        z INTEGER NOT NULL
+    );
+    INSERT INTO placed_furniture_new (item_id, uuid, name, angle_index, x, y, z)
+        SELECT item_id, uuid, name, angle_index, x, y, z FROM placed_furniture;
+    DROP TABLE placed_furniture;
+    ALTER TABLE placed_furniture_new RENAME TO placed_furniture;
+
+    CREATE TABLE equipped_clothes_new (
+        uuid INTEGER PRIMARY KEY REFERENCES users (uuid) ON DELETE CASCADE NOT NULL,
+        Head TEXT,
+        Torso TEXT,
+        Legs TEXT,
+        Feet TEXT
+    );
+    INSERT INTO equipped_clothes_new (uuid, Head, Torso, Legs, Feet)
+        SELECT uuid, Head, Torso, Legs, Feet FROM equipped_clothes;
+    DROP TABLE equipped_clothes;
+    ALTER TABLE equipped_clothes_new RENAME TO equipped_clothes;
+    ''',
+
+    # 2: secondary indexes for the per-user and per-parent lookups
+    '''
+    CREATE INDEX IF NOT EXISTS idx_tasks_uuid ON tasks (uuid);
+    CREATE INDEX IF NOT EXISTS idx_subtasks_parent_id ON subtasks (parent_id);
+    CREATE INDEX IF NOT EXISTS idx_inventory_uuid_item_type ON inventory (uuid, item_type);
+    CREATE INDEX IF NOT EXISTS idx_placed_furniture_uuid ON placed_furniture (uuid);
+    ''',
+
+    # 3: append-only money ledger, a user's balance is users.money plus the deltas not yet compacted into it
+    '''
+    CREATE TABLE ledger (
+        entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        uuid INTEGER REFERENCES users (uuid) ON DELETE CASCADE NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        ref TEXT,
+        created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_ledger_uuid ON ledger (uuid, entry_id);
+    ''',
+
+    # 4: keyset index for paging the task panel by (status, due date, taskid), it also covers the plain uuid lookups
+    '''
+    CREATE INDEX IF NOT EXISTS idx_tasks_page ON tasks (uuid, status, COALESCE(date_due, '9999-12-31'), taskid);
+    DROP INDEX IF EXISTS idx_tasks_uuid;
+    ''',
+
+    # 5: subtask completion counters on tasks, kept in step with the subtasks table by triggers
+    '''
+    ALTER TABLE tasks ADD COLUMN subtasks_total INTEGER NOT NULL DEFAULT (0);
+    ALTER TABLE tasks ADD COLUMN subtasks_done INTEGER NOT NULL DEFAULT (0);
+    UPDATE tasks SET
+        subtasks_total = (SELECT COUNT(*) FROM subtasks WHERE parent_id = tasks.taskid),
+        subtasks_done = (SELECT COUNT(*) FROM subtasks WHERE parent_id = tasks.taskid AND status != 0);
+
+    CREATE TRIGGER subtasks_count_insert AFTER INSERT ON subtasks BEGIN
+        UPDATE tasks SET subtasks_total = subtasks_total + 1, subtasks_done = subtasks_done + (NEW.status != 0)
+        WHERE taskid = NEW.parent_id;
+    END;
+    CREATE TRIGGER subtasks_count_delete AFTER DELETE ON subtasks BEGIN
+        UPDATE tasks SET subtasks_total = subtasks_total - 1, subtasks_done = subtasks_done - (OLD.status != 0)
+        WHERE taskid = OLD.parent_id;
+    END;
+    CREATE TRIGGER subtasks_count_update AFTER UPDATE OF status, parent_id ON subtasks BEGIN
+        UPDATE tasks SET subtasks_total = subtasks_total - 1, subtasks_done = subtasks_done - (OLD.status != 0)
+        WHERE taskid = OLD.parent_id;
+        UPDATE tasks SET subtasks_total = subtasks_total + 1, subtasks_done = subtasks_done + (NEW.status != 0)
+        WHERE taskid = NEW.parent_id;
+    END;
+    ''',
+
+    # 6: full-text indexes over task and subtask names, external content tables kept in sync by triggers
+    '''
+    CREATE VIRTUAL TABLE tasks_fts USING fts5(name, content='tasks', content_rowid='taskid', prefix='2 3');
+    CREATE VIRTUAL TABLE subtasks_fts USING fts5(name, content='subtasks', content_rowid='subtask_id', prefix='2 3');
+    INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild');
+    INSERT INTO subtasks_fts (subtasks_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, name) VALUES (NEW.taskid, NEW.name);
+    END;
+    CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, name) VALUES ('delete', OLD.taskid, OLD.name);
+    END;
+    CREATE TRIGGER tasks_fts_update AFTER UPDATE OF name ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, name) VALUES ('delete', OLD.taskid, OLD.name);
+        INSERT INTO tasks_fts (rowid, name) VALUES (NEW.taskid, NEW.name);
+    END;
+
+    CREATE TRIGGER subtasks_fts_insert AFTER INSERT ON subtasks BEGIN
+        INSERT INTO subtasks_fts (rowid, name) VALUES (NEW.subtask_id, NEW.name);
+    END;
+    CREATE TRIGGER subtasks_fts_delete AFTER DELETE ON subtasks BEGIN
+        INSERT INTO subtasks_fts (subtasks_fts, rowid, name) VALUES ('delete', OLD.subtask_id, OLD.name);
+    END;
+    CREATE TRIGGER subtasks_fts_update AFTER UPDATE OF name ON subtasks BEGIN
+        INSERT INTO subtasks_fts (subtasks_fts, rowid, name) VALUES ('delete', OLD.subtask_id, OLD.name);
+        INSERT INTO subtasks_fts (rowid, name) VALUES (NEW.subtask_id, NEW.name);
+    END;
+    ''',
+
+    # 7: epoch deadline column derived from the local date_due and time_due, the panel order and due date ranges read it off one index
+    '''
+    ALTER TABLE tasks ADD COLUMN due_at INTEGER;
+    UPDATE tasks SET due_at = CAST(strftime('%s', date_due || ' ' || COALESCE(time_due, '23:59'), 'utc') AS INTEGER)
+    WHERE date_due IS NOT NULL;
+
+    CREATE TRIGGER tasks_due_at_insert AFTER INSERT ON tasks WHEN NEW.date_due IS NOT NULL BEGIN
+        UPDATE tasks SET due_at = CAST(strftime('%s', NEW.date_due || ' ' || COALESCE(NEW.time_due, '23:59'), 'utc') AS INTEGER)
+        WHERE taskid = NEW.taskid;
+    END;
+    CREATE TRIGGER tasks_due_at_update AFTER UPDATE OF date_due, time_due ON tasks BEGIN
+        UPDATE tasks SET due_at = CAST(strftime('%s', NEW.date_due || ' ' || COALESCE(NEW.time_due, '23:59'), 'utc') AS INTEGER)
+        WHERE taskid = NEW.taskid;
+    END;
+
+    CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks (uuid, status, COALESCE(due_at, 253402300799), taskid);
+    DROP INDEX IF EXISTS idx_tasks_page;
+    ''',
+
+    # 8: name lookup for skipping tasks a bulk import already added
+    '''
+    CREATE INDEX IF NOT EXISTS idx_tasks_name ON tasks (uuid, name);
+    ''',
+
+    # 9: model answers kept by prompt key so a repeated task is priced and planned without running the model again
+    '''
+    CREATE TABLE inference_cache (
+        prompt_key TEXT PRIMARY KEY NOT NULL,
+        reward REAL NOT NULL,
+        subtasks TEXT,
+        hits INTEGER DEFAULT (0),
+        created_at INTEGER,
+        last_used INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_inference_cache_used ON inference_cache (last_used);
+    ''',
+
+    # 10: rows of the task embedding file and the cached answer each belongs to, an evicted answer frees its row
+    '''
+    CREATE TABLE inference_embeddings (
+        row INTEGER PRIMARY KEY NOT NULL,
+        prompt_key TEXT,
+        num_steps INTEGER,
+        scope TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_inference_embeddings_key ON inference_embeddings (prompt_key);
+
+    CREATE TRIGGER inference_cache_evict AFTER DELETE ON inference_cache BEGIN
+        UPDATE inference_embeddings SET prompt_key = NULL WHERE prompt_key = OLD.prompt_key;
+    END;
+    ''',
+]
+
+def schema_version(conn):
+    '''Reads the schema version stored in the database header
+
+    Input: object
+    Output: int'''
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def run_migrations(conn):
+    '''Applies every migration newer than the stored schema version, each in its own transaction
+
+    Input: object
+    Output: int'''
+    version = schema_version(conn)
+    if version >= len(MIGRATIONS):
+        return version
+
+    # Table rebuilds need foreign key enforcement off, and the pragma is ignored inside a transaction
+    conn.commit()
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for target in range(version + 1, len(MIGRATIONS) + 1):
+            try:
+                conn.executescript(f'BEGIN; {MIGRATIONS[target - 1]} PRAGMA user_version = {target}; COMMIT;')
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    return schema_version(conn)
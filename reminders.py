@@ -0,0 +1,108 @@
+import heapq
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+### Deadline reminders, one timer armed for whichever open deadline comes next ###
+class ReminderScheduler(QObject):
+    # QTimer intervals are signed 32 bit milliseconds, a deadline further out is reached in several hops
+    max_interval_ms = 2**31 - 1
+
+    task_due = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        '''Min-heap of (due_at, taskid) for open deadlines, entries replaced or cancelled stay in the heap
+        and are skipped once they surface because they no longer match the pending table
+
+        Input: object
+        Output: None'''
+        super().__init__(parent)
+        self.heap = []
+        self.pending = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.fire_due)
+
+    def load(self, deadlines):
+        '''Replaces every pending reminder with (taskid, due_at, name) rows, heapified in one go
+
+        Input: list
+        Output: None'''
+        self.pending = {taskid: (due_at, name) for taskid, due_at, name in deadlines}
+        self.heap = [(due_at, taskid) for taskid, (due_at, name) in self.pending.items()]
+        heapq.heapify(self.heap)
+        self.arm()
+
+    def clear(self):
+        '''Drops every pending reminder and stops the timer
+
+        Input: None
+        Output: None'''
+        self.heap = []
+        self.pending = {}
+        self.timer.stop()
+
+    def schedule(self, taskid, due_at, name):
+        '''Adds or moves the reminder for a task, past deadlines are not reminded of
+
+        Input: int, int, str
+        Output: None'''
+        if due_at is None or due_at <= time.time():
+            self.cancel(taskid)
+            return
+        self.pending[taskid] = (due_at, name)
+        heapq.heappush(self.heap, (due_at, taskid))
+        if self.heap[0] == (due_at, taskid):
+            self.arm()
+
+    def cancel(self, taskid):
+        '''Forgets a task's reminder, its heap entry is skipped when it surfaces
+
+        Input: int
+        Output: None'''
+        if self.pending.pop(taskid, None) is not None:
+            self.drop_stale()
+            self.arm()
+
+    def track(self, task):
+        '''Schedules or cancels a task's reminder to match its current status and deadline
+
+        Input: object
+        Output: None'''
+        if task.status == 0 and task.deadline != 0:
+            self.schedule(task.taskid, task.due_at, task.name)
+        else:
+            self.cancel(task.taskid)
+
+    def drop_stale(self):
+        '''Pops cancelled and replaced entries off the top of the heap
+
+        Input: None
+        Output: None'''
+        while self.heap and self.pending.get(self.heap[0][1], (None,))[0] != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def arm(self):
+        '''Points the single timer at the nearest pending deadline
+
+        Input: None
+        Output: None'''
+        self.drop_stale()
+        if not self.heap:
+            self.timer.stop()
+            return
+        delay_ms = max(0, int((self.heap[0][0] - time.time()) * 1000))
+        self.timer.start(min(delay_ms, self.max_interval_ms))
+
+    def fire_due(self):
+        '''Emits task_due for every deadline that has arrived, then re-arms for the next one
+
+        Input: None
+        Output: None'''
+        now = time.time()
+        self.drop_stale()
+        while self.heap and self.heap[0][0] <= now:
+            due_at, taskid = heapq.heappop(self.heap)
+            due_at, name = self.pending.pop(taskid)
+            self.task_due.emit(taskid, name)
+            self.drop_stale()
+        self.arm()
@@ -0,0 +1,126 @@
+import os
+import numpy as np
+
+### Semantic answer cache, task name embeddings in a memory mapped matrix searched for the nearest cached task ###
+class SemanticCache():
+    # Mean pooled embeddings of a chat model sit close together, a loose threshold would hand one task another's steps
+    similarity_threshold = 0.93
+    top_k = 8
+    initial_rows = 1024
+
+    def __init__(self, handler, path='appdata/task_embeddings.f32'):
+        '''Unit length float32 embeddings stored row by row in a file mapped into memory, which cached answer
+        each row belongs to is kept by the handler's database. The file is opened on first use, once the embedding width is known
+
+        Input: object, str
+        Output: None'''
+        self.handler = handler
+        self.path = path
+        self.scope = None
+        self.matrix = None
+        self.steps = None
+        self.live = None
+        self.count = 0
+
+    def open(self, scope, width):
+        '''Maps the embedding file and loads which rows are live, a file of another width or an unreadable one is started over
+
+        Input: str, int
+        Output: None'''
+        rows = self.handler.query_embedding_rows(scope)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        count = rows[-1][0] + 1 if rows else 0
+        if size % (width * 4) or size // (width * 4) < count:
+            self.handler.clear_embedding_rows()
+            rows, count, size = [], 0, 0
+        capacity = max(size // (width * 4), self.initial_rows)
+
+        self.scope = scope
+        self.count = count
+        self.steps = np.full(capacity, -1, dtype=np.int32)
+        self.live = np.zeros(capacity, dtype=bool)
+        for row, num_steps, live in rows:
+            self.steps[row] = num_steps
+            self.live[row] = bool(live)
+        self.map(capacity, width)
+
+    def map(self, capacity, width):
+        '''Sizes the embedding file to capacity rows and maps it
+
+        Input: int, int
+        Output: None'''
+        self.matrix = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as file:
+            if file.tell() < capacity * width * 4:
+                file.truncate(capacity * width * 4)
+        self.matrix = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity, width))
+
+    def ensure_open(self, scope, vector):
+        '''Opens the file for the current model and prompt version, reopening it when either changed
+
+        Input: str, object
+        Output: None'''
+        if self.matrix is None or self.scope != scope or self.matrix.shape[1] != len(vector):
+            self.open(scope, len(vector))
+
+    def lookup(self, scope, vector, num_steps):
+        '''Returns the cached (reward, subtasks) of the most similar live task with the same step count, or None.
+        Every live row is scored in one matrix product and only the top few are checked against the database
+
+        Input: str, object, int
+        Output: tuple'''
+        self.ensure_open(scope, vector)
+        if not self.count:
+            return None
+        scores = np.asarray(self.matrix[:self.count]) @ vector
+        scores[~(self.live[:self.count] & (self.steps[:self.count] == num_steps))] = -1.0
+
+        k = min(self.top_k, self.count)
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        best = best[scores[best] >= self.similarity_threshold]
+        if not len(best):
+            return None
+
+        keys = self.handler.query_embedding_keys(best.tolist())
+        for row in best.tolist():
+            if row not in keys:
+                # The answer was evicted from the inference cache, its row can take a new embedding
+                self.live[row] = False
+                continue
+            answer = self.handler.fetch_inference(keys[row])
+            if answer is not None:
+                return answer
+            self.live[row] = False
+        return None
+
+    def add(self, scope, vector, prompt_key, num_steps):
+        '''Stores a task's embedding for the answer cached under prompt_key, reusing a freed row before growing the file
+
+        Input: str, object, str, int
+        Output: None'''
+        self.ensure_open(scope, vector)
+        free = np.flatnonzero(~self.live[:self.count])
+        if len(free):
+            row = int(free[0])
+        else:
+            row = self.count
+            if row == len(self.matrix):
+                self.grow()
+            self.count += 1
+        self.matrix[row] = vector
+        self.steps[row] = num_steps
+        self.live[row] = True
+        self.handler.save_embedding_row(row, prompt_key, num_steps, scope)
+
+    def grow(self):
+        '''Doubles the rows of the embedding file
+
+        Input: None
+        Output: None'''
+        capacity, width = self.matrix.shape
+        self.matrix.flush()
+        self.map(capacity * 2, width)
+        self.steps = np.concatenate([self.steps, np.full(capacity, -1, dtype=np.int32)])
+        self.live = np.concatenate([self.live, np.zeros(capacity, dtype=bool)])
@@ -2,17 +2,19 @@ from PyQt6.QtWidgets import (
     QWidget, QPushButton, QLabel, QHBoxLayout, QScrollArea
 )
 from PyQt6.QtCore import Qt, pyqtSignal
+from data_manager import Inventory
 
 ### DATA ###
 class GameData:
     '''Central data, stores everything for player, money outfit, placed items etc'''
     def __init__(self):
         self.money = 300
-        self.inventory_clothes = []
+        self.inventory_clothes = Inventory()
         self.worn_clothes = []
         self.equipped_clothes = {}
-        self.inventory_furniture = []
+        self.inventory_furniture = Inventory()
         self.placed_furniture = []
+        self.removed_furniture = []
 
 ### UNIVERSAL_STYLES ###
 class UniversalStyles:
@@ -1,278 +1,770 @@
-from llama_cpp import Llama
+import hashlib
+import json
+import logging
 import numpy as np
+import os
 import re
 import sqlite3
-from data_manager import DatabaseConnect as DBC
-
-class UserTask():
-    def __init__(self, uuid, taskid, name, date_due, time_due, deadline, status, subdivisions, reward, subtasks, grant_status):
-        self.uuid = uuid
-        self.taskid = taskid
-        self.name = name
-        self.status = status
-        self.subdivisions = subdivisions
-        self.deadline = deadline
-        self.time_due = time_due
-        self.date_due = date_due
-        self.reward = reward
-        self.grant_status = grant_status
-        self.subtasks = subtasks
+import threading
+import time
+from concurrent.futures import Future
+from itertools import groupby
+from data_manager import DatabaseConnect as DBC, UserTask, task_cache, TASK_DUE_KEY, NO_DEADLINE, urgency_bounds
+
+logger = logging.getLogger('tikkit.tasks')
 
 ### Creating AI Engine class to allow interactions with local AI model ###
 class AIEngine():
+    model_path = "qwen2.5-0.5b-instruct-q4_k_m.gguf"
+
+    # Token budget of a plan, the JSON frame and difficulty plus a few words per step
+    plan_base_tokens = 24
+    plan_step_tokens = 16
+    plan_attempts = 2
+
+    # Raise when the prompts or their parsing change so answers cached for the old ones are no longer used
+    prompt_version = 1
+
     def __init__(self):
-        self.llm = Llama(
-            model_path="qwen2.5-0.5b-instruct-q4_k_m.gguf", 
-            n_ctx=2048, 
-            n_gpu_layers=0, 
-            verbose=False
-        )
+        '''Creates the engine without loading the model, warm() or the first prompt loads it
 
-    def get_subtask_list(self, task_name, num_steps):
-        '''Prompts AI to generate subtask list for divided task
+        Input: None
+        Output: None'''
+        self._future = None
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._embedder = None
+        self._embed_lock = threading.Lock()
+
+    def warm(self):
+        '''Starts loading the model on a background thread unless it already started, returns the future holding it
+
+        Input: None
+        Output: object'''
+        with self._lock:
+            if self._future is None:
+                self._future = Future()
+                threading.Thread(target=self._load_model, args=(self._future,), name='ai-warmup', daemon=True).start()
+            return self._future
+
+    def _load_model(self, future):
+        '''Loads the model into the future, importing llama.cpp here keeps it off the startup path as well
 
-        Input: str, int
-        Output: dict'''
-        list_msg = [
-            {
-                "role": "system", 
-                "content": "You are a rigid automated planner. Output ONLY a numbered list. Maximum 4 words per step."
-            },
+        Input: object
+        Output: None'''
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            from llama_cpp import Llama
+            llm = Llama(
+                model_path=self.model_path, 
+                n_ctx=2048, 
+                n_gpu_layers=0, 
+                verbose=False
+            )
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(llm)
 
-            {
-                "role": "user", 
-                "content": f"Task: {task_name}\nRequirement: Create exactly {num_steps} steps. Keep each step under 4 words."
-            }
-        ]
+    @property
+    def llm(self):
+        '''Returns the loaded model, waiting for the warm up to finish if it is still running
 
-        task_list = self.llm.create_chat_completion(
-            messages=list_msg,
-            temperature=0.1,
-            max_tokens=250
-        )
+        Input: None
+        Output: object'''
+        return self.warm().result()
 
-        task_list = task_list['choices'][0]['message']['content']
-        sub_tasks_dict = self.split_task_list(task_list)
+    def is_ready(self):
+        '''Tells whether the model is loaded and prompts will not wait
 
-        return sub_tasks_dict
-    
-    def get_task_diff(self, task_name):
-        '''Prompts AI to generate difficulty scaling for task
+        Input: None
+        Output: bool'''
+        future = self._future
+        return future is not None and future.done() and future.exception() is None
+
+    def load_failed(self):
+        '''Tells whether loading the model finished with an error, so no prompt can be answered this session
+
+        Input: None
+        Output: bool'''
+        future = self._future
+        return future is not None and future.done() and future.exception() is not None
+
+    def on_ready(self, callback):
+        '''Calls callback with whether loading worked once the model finishes loading, starting the warm up if needed.
+        The callback runs on the loading thread, or right away if loading already finished
+
+        Input: function
+        Output: None'''
+        self.warm().add_done_callback(lambda future: callback(future.exception() is None))
+
+    def model_fingerprint(self, sample_bytes=1 << 20):
+        '''Hashes the model file's size, modification time and first megabyte once, so a replaced model
+        does not reuse the old one's answers without reading the whole file
+
+        Input: int
+        Output: str'''
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            try:
+                stat = os.stat(self.model_path)
+                digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+                with open(self.model_path, 'rb') as file:
+                    digest.update(file.read(sample_bytes))
+            except OSError:
+                digest.update(b'missing')
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def cache_key(self, task_name, num_steps):
+        '''Builds the inference cache key of a task from its normalized name, step count, model and prompt version
+
+        Input: str, int
+        Output: str'''
+        name = ' '.join(task_name.lower().split())
+        text = f'{self.cache_scope()}\0{num_steps}\0{name}'
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def cache_scope(self):
+        '''Names the model and prompt version cached answers and embeddings belong to
+
+        Input: None
+        Output: str'''
+        return f'{self.prompt_version}:{self.model_fingerprint()}'
+
+    @property
+    def embedder(self):
+        '''Returns an embedding instance of the model, loaded on first use by the thread asking for it.
+        llama.cpp maps the weights file, so it shares their memory with the chat instance
+
+        Input: None
+        Output: object'''
+        with self._embed_lock:
+            if self._embedder is None:
+                from llama_cpp import Llama
+                self._embedder = Llama(
+                    model_path=self.model_path, 
+                    n_ctx=128, 
+                    n_gpu_layers=0, 
+                    embedding=True, 
+                    verbose=False
+                )
+            return self._embedder
+
+    def embed_task(self, task_name):
+        '''Embeds a normalized task name as a unit length vector, token embeddings are mean pooled when the model does not pool them
 
         Input: str
-        Output: int'''
-        diff_msg = [
+        Output: object'''
+        embedding = self.embedder.create_embedding(' '.join(task_name.lower().split()))
+        vector = np.asarray(embedding['data'][0]['embedding'], dtype=np.float32)
+        if vector.ndim == 2:
+            vector = vector.mean(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def enrich_task(self, task_name, num_steps):
+        '''Prices a task from its AI difficulty and, when it is divided, plans its steps
+
+        Input: str, int
+        Output: int, dict'''
+        # A plan the model cut short or garbled is asked for again before the draft is given up on
+        for attempt in range(self.plan_attempts):
+            try:
+                difficulty, subtasks = self.get_task_plan(task_name, num_steps)
+                break
+            except ValueError:
+                if attempt == self.plan_attempts - 1:
+                    raise
+        return difficulty*10, subtasks if num_steps else 0
+
+    def get_task_plan(self, task_name, num_steps=0):
+        '''Prompts AI once for difficulty scaling and, when num_steps is set, the subtask list, as JSON held to a schema.
+        A reply cut off by the token budget or missing a readable difficulty or the requested steps raises ValueError,
+        so the draft stays unpriced instead of being saved with a made up answer
+
+        Input: str, int
+        Output: float, dict'''
+        properties = {'difficulty': {'type': 'integer', 'minimum': 0, 'maximum': 100}}
+        requirement = 'Rate a difficulty out of 100.'
+        if num_steps:
+            properties['steps'] = {
+                'type': 'array',
+                'items': {'type': 'string', 'maxLength': 40},
+                'minItems': num_steps,
+                'maxItems': num_steps
+            }
+            requirement += f' Create exactly {num_steps} steps. Keep each step under 4 words.'
+
+        plan_msg = [
             {
                 "role": "system", 
-                "content": "You are a difficulty rater. Output ONLY a single integer number between 0 and 100. Do not write words."
+                "content": "You are a rigid automated planner and difficulty rater. Output ONLY JSON matching the schema."
             },
 
             {
                 "role": "user", 
-                "content": f"Task: {task_name}\nRequirement: Rate a difficulty out of 100."
+                "content": f"Task: {task_name}\nRequirement: {requirement}"
             }
         ]
-        
-        difficulty = self.llm.create_chat_completion(
-            messages=diff_msg,
+
+        # The schema becomes a grammar, so the reply cannot be anything but the JSON object and ends with it
+        plan = self.llm.create_chat_completion(
+            messages=plan_msg,
             temperature=0.1,
-            max_tokens=250
+            max_tokens=self.plan_base_tokens + self.plan_step_tokens*num_steps,
+            stop=['<|im_end|>'],
+            response_format={
+                'type': 'json_object',
+                'schema': {'type': 'object', 'properties': properties, 'required': list(properties)}
+            }
         )
 
-        difficulty = int(difficulty['choices'][0]['message']['content'])
-        difficulty = np.interp(difficulty, [75, 100], [0, 100])
+        content = plan['choices'][0]['message']['content']
+        try:
+            plan = json.loads(content)
+        except (ValueError, TypeError):
+            raise ValueError(f'incomplete plan from the model: {content!r}') from None
 
-        return difficulty
-    
-    def split_task_list(self, task_list):
-        '''Splits task string user RE to segements
+        difficulty = plan.get('difficulty') if isinstance(plan, dict) else None
+        if isinstance(difficulty, bool) or not isinstance(difficulty, (int, float)):
+            raise ValueError(f'no difficulty in the plan from the model: {content!r}')
 
-        Input: str
-        Output: dict'''
-        segments = re.split(r'(\d+)\.', task_list)
-        sub_tasks_dict = {}
-
-        for i in range(1, len(segments), 2):
-            step_number = int(segments[i])
-            step_text = segments[i+1].strip()
-            sub_tasks_dict[step_number] = step_text
-        
-        return sub_tasks_dict
+        steps = plan.get('steps') if isinstance(plan.get('steps'), list) else []
+        steps = [str(step).strip() for step in steps if str(step).strip()]
+        if len(steps) < num_steps:
+            raise ValueError(f'the model planned {len(steps)} of {num_steps} steps')
+        sub_tasks_dict = {i: step for i, step in enumerate(steps[:num_steps], start=1)}
+
+        return self.parse_difficulty(difficulty), sub_tasks_dict
+
+    def parse_difficulty(self, value):
+        '''Turns a model's difficulty out of 100 into the reward scaling, out of range answers are clamped
+
+        Input: float
+        Output: float'''
+        difficulty = min(max(int(value), 0), 100)
+        return np.interp(difficulty, [75, 100], [0, 100])
     
 ai_engine = AIEngine()
 
 ### Creating Task Handler to interact with database for task relvant queries ###
 class TaskDataHandler(DBC):
+    # Entries kept in the inference cache, a few hundred bytes each
+    inference_cache_size = 5000
+
     def __init__(self):
         super().__init__()
+        self.task_cache = task_cache
+        self._inference_lock = threading.Lock()
+        self.inference_hits = 0
+        self.inference_misses = 0
+        self._done_lock = threading.Lock()
+        self.done_counts = {}
     
     def task_insertion(self, task_specs):
-        '''Insert task and subtasks if the task is divided
+        '''Insert task and subtasks if the task is divided, a list of task specifications is inserted in the same single commit
 
-        Input: object
-        Output: int'''
+        Input: object or list
+        Output: int or list'''
+        # Returns the new taskid, or the list of them for a list. A failed insert is logged and raised, nothing of it is kept
+        specs_list = task_specs if isinstance(task_specs, list) else [task_specs]
+        for uuid in {specs.uuid for specs in specs_list}:
+            self.task_cache.invalidate(uuid)
+
+        taskids = []
         try:
+            # Leaving the block commits every task and subtask together, or rolls all of them back
             with self._get_conn() as conn:
                 curr = conn.cursor()
-                curr.execute(
-                    'INSERT INTO tasks (uuid, name, subdivisions, deadline, date_due, time_due, reward) VALUES (?, ?, ?, ?, ?, ?, ?)', 
-                    (task_specs.uuid, task_specs.name, task_specs.subdivisions, task_specs.deadline, task_specs.date_due, task_specs.time_due, task_specs.reward)
-                )
-                current_task_id = curr.lastrowid
-                conn.commit()
-        except sqlite3.IntegrityError:
-            return 0
-        
-        if task_specs.subdivisions != 0:
-            for i in range(task_specs.subdivisions):
-                try:
-                    with self._get_conn() as conn:
-                        conn.cursor().execute(
-                            'INSERT INTO subtasks (parent_id, subtask_order, name) VALUES (?, ?, ?)', 
-                            (current_task_id, i, task_specs.subtasks[i+1])
+                for specs in specs_list:
+                    curr.execute(
+                        'INSERT INTO tasks (uuid, name, subdivisions, deadline, date_due, time_due, reward) VALUES (?, ?, ?, ?, ?, ?, ?)', 
+                        (specs.uuid, specs.name, specs.subdivisions, specs.deadline, specs.date_due, specs.time_due, specs.reward)
+                    )
+                    current_task_id = curr.lastrowid
+                    # Drafts still waiting for enrichment get their subtasks once the steps are planned
+                    if specs.subdivisions != 0 and specs.subtasks:
+                        curr.executemany(
+                            'INSERT INTO subtasks (parent_id, subtask_order, name) VALUES (?, ?, ?)',
+                            [(current_task_id, i, specs.subtasks[i+1]) for i in range(specs.subdivisions)]
                         )
-                        conn.commit()
-                except sqlite3.IntegrityError as e:
-                    print(e)
-                    return 0
-                
+                    taskids.append(current_task_id)
+        except sqlite3.Error:
+            logger.exception('could not insert %d task(s) for users %s', len(specs_list), sorted({specs.uuid for specs in specs_list}))
+            raise
+
+        if isinstance(task_specs, list):
+            return taskids
+        return taskids[0]
+
+    def insert_task_rows(self, rows):
+        '''Inserts imported tasks in one transaction, skipping any the user already has with the same name and deadline.
+        Rows are (uuid, name, deadline, date_due, time_due, subtasks), rewards are left NULL to be priced later
+
+        Input: list
+        Output: int'''
+        # Checking inside the insert also catches repeats earlier in the same file, they are already in the transaction
+        insert_sql = '''INSERT INTO tasks (uuid, name, subdivisions, deadline, date_due, time_due, reward)
+                        SELECT ?, ?, ?, ?, ?, ?, NULL
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM tasks WHERE uuid = ? AND name = ? AND date_due IS ? AND time_due IS ?
+                        )'''
+        for uuid in {row[0] for row in rows}:
+            self.task_cache.invalidate(uuid)
+
+        inserted = 0
+        with self._get_conn() as conn:
+            curr = conn.cursor()
+            # Runs of plain tasks go through executemany, divided tasks one by one since their subtasks need the new taskid.
+            # Rows keep their file order so the first of two repeats is the one kept
+            for divided, run in groupby(rows, key=lambda row: bool(row[5])):
+                if not divided:
+                    curr.executemany(insert_sql, [
+                        (uuid, name, 0, deadline, date_due, time_due, uuid, name, date_due, time_due)
+                        for uuid, name, deadline, date_due, time_due, subtasks in run
+                    ])
+                    inserted += curr.rowcount
+                    continue
+
+                for uuid, name, deadline, date_due, time_due, subtasks in run:
+                    curr.execute(insert_sql, (uuid, name, len(subtasks), deadline, date_due, time_due, uuid, name, date_due, time_due))
+                    if curr.rowcount:
+                        inserted += 1
+                        current_task_id = curr.lastrowid
+                        curr.executemany(
+                            'INSERT INTO subtasks (parent_id, subtask_order, name) VALUES (?, ?, ?)',
+                            [(current_task_id, i, subtask) for i, subtask in enumerate(subtasks)]
+                        )
+        return inserted
+
+    def query_unpriced_tasks(self, uuid, limit=20, exclude=()):
+        '''Collect (taskid, name, steps) of a user's tasks still waiting for a reward, open tasks first. steps is the number
+        of steps still to plan, 0 for tasks that already have their subtasks such as divided imports, so only the reward is asked for.
+        exclude holds taskids to pass over, such as ones that already failed
+
+        Input: int, int, iterable
+        Output: list'''
+        exclude = list(exclude)
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'''SELECT taskid, name, CASE WHEN subtasks_total > 0 THEN 0 ELSE subdivisions END FROM tasks
+                   WHERE uuid = ? AND reward IS NULL AND taskid NOT IN ({', '.join('?' * len(exclude))})
+                   ORDER BY status, taskid LIMIT ?''',
+                [uuid] + exclude + [limit]
+            )
+            return cursor.fetchall()
+
+    def apply_enrichment(self, taskid, reward, subtasks=None):
+        '''Fills in the reward and planned subtasks of a task inserted before enrichment finished, in one transaction.
+        A task completed while it waited claims its reward now, returns the task's uuid and that reward
+
+        Input: int, int, dict
+        Output: int, int'''
+        self.task_cache.invalidate_task(taskid)
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE tasks SET reward = ? WHERE taskid = ? AND reward IS NULL', (reward, taskid))
+            cursor.execute('SELECT subtasks_total, subdivisions FROM tasks WHERE taskid = ?', (taskid,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == 0 and row[1] != 0:
+                # The model may plan more or fewer steps than asked for, at most the requested number are kept.
+                # With no steps at all the task becomes undivided, a divided task without subtasks could never be completed
+                steps = [step for order, step in sorted(subtasks.items())][:row[1]] if subtasks else []
+                cursor.executemany(
+                    'INSERT INTO subtasks (parent_id, subtask_order, name) VALUES (?, ?, ?)',
+                    [(taskid, i, step) for i, step in enumerate(steps)]
+                )
+                cursor.execute('UPDATE tasks SET subdivisions = ? WHERE taskid = ?', (len(steps), taskid))
+            cursor.execute('SELECT uuid, status FROM tasks WHERE taskid = ?', (taskid,))
+            row = cursor.fetchone()
+            if row is None:
+                return None, 0
+            uuid, status = row
+            return uuid, self._claim_reward(cursor, taskid) if status == 1 else 0
+
+    def fetch_inference(self, prompt_key):
+        '''Returns the cached (reward, subtasks) of a prompt key or None, a found entry has its use counted and is marked as recently used.
+        The session hit rate is left to note_inference_lookup, since one draft may fetch several keys
+
+        Input: str
+        Output: tuple'''
+        with self._get_conn() as conn:
+            row = conn.execute('SELECT reward, subtasks FROM inference_cache WHERE prompt_key = ?', (prompt_key,)).fetchone()
+        if row is None:
+            return None
+
+        # The hit count and recency are bookkeeping, so they wait for the writer instead of holding up the answer
+        now = int(time.time())
+        self._submit_write(
+            None,
+            lambda cursor: cursor.execute(
+                'UPDATE inference_cache SET hits = hits + 1, last_used = ? WHERE prompt_key = ?', (now, prompt_key)
+            )
+        )
+        reward, subtasks = row
+        return reward, {int(order): step for order, step in json.loads(subtasks).items()} if subtasks else 0
+
+    def note_inference_lookup(self, hit):
+        '''Counts one draft answered from the inference cache, exactly or by a similar task, or one that needed the model
+
+        Input: bool
+        Output: None'''
+        with self._inference_lock:
+            if hit:
+                self.inference_hits += 1
+            else:
+                self.inference_misses += 1
+
+    def store_inference(self, prompt_key, reward, subtasks, max_entries=None):
+        '''Caches a model answer under its prompt key, evicting the least recently used entries beyond max_entries
+
+        Input: str, int, dict, int
+        Output: None'''
+        max_entries = self.inference_cache_size if max_entries is None else max_entries
+        now = int(time.time())
+        with self._get_conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO inference_cache (prompt_key, reward, subtasks, hits, created_at, last_used) VALUES (?, ?, ?, 0, ?, ?)',
+                (prompt_key, float(reward), json.dumps(subtasks) if subtasks else None, now, now)
+            )
+            conn.execute(
+                'DELETE FROM inference_cache WHERE prompt_key IN (SELECT prompt_key FROM inference_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (max_entries,)
+            )
+
+    def query_embedding_rows(self, scope):
+        '''Collect (row, num_steps, live) of every row in the task embedding file, rows of another model or prompt version
+        or of an evicted answer are not live
+
+        Input: str
+        Output: list'''
+        with self._get_conn() as conn:
+            return conn.execute(
+                'SELECT row, num_steps, prompt_key IS NOT NULL AND scope = ? FROM inference_embeddings ORDER BY row', (scope,)
+            ).fetchall()
+
+    def query_embedding_keys(self, rows):
+        '''Maps embedding rows to the prompt keys of their answers, rows whose answer was evicted are left out
+
+        Input: list
+        Output: dict'''
+        with self._get_conn() as conn:
+            cursor = conn.execute(
+                f'SELECT row, prompt_key FROM inference_embeddings WHERE row IN ({", ".join("?" * len(rows))}) AND prompt_key IS NOT NULL',
+                [int(row) for row in rows]
+            )
+            return dict(cursor.fetchall())
+
+    def save_embedding_row(self, row, prompt_key, num_steps, scope):
+        '''Points an embedding row at the answer cached under prompt_key
+
+        Input: int, str, int, str
+        Output: None'''
+        with self._get_conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO inference_embeddings (row, prompt_key, num_steps, scope) VALUES (?, ?, ?, ?)',
+                (row, prompt_key, num_steps, scope)
+            )
+
+    def clear_embedding_rows(self):
+        '''Forgets every embedding row, used when the embedding file is recreated
+
+        Input: None
+        Output: None'''
+        with self._get_conn() as conn:
+            conn.execute('DELETE FROM inference_embeddings')
+
+    def inference_cache_stats(self):
+        '''Returns the drafts answered from the inference cache and those that needed the model since start up, with its size and lifetime hits
+
+        Input: None
+        Output: dict'''
+        with self._get_conn() as conn:
+            size, lifetime_hits = conn.execute('SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM inference_cache').fetchone()
+        with self._inference_lock:
+            lookups = self.inference_hits + self.inference_misses
+            return {
+                'hits': self.inference_hits,
+                'misses': self.inference_misses,
+                'hit_rate': self.inference_hits / lookups if lookups else 0.0,
+                'size': size,
+                'lifetime_hits': lifetime_hits
+            }
+
     def query_user_tasks(self, uuid):
-        '''Collect user tasks from database
+        '''Collect all of a user's tasks in task panel order
 
         Input: int
         Output: list'''
-        taskid_list = []
+        return self._load_user_tasks(uuid)
 
-        with self._get_conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT taskid FROM tasks WHERE uuid = ?', (uuid,))
-            result = cursor.fetchall()
+    def query_tasks(self, uuid, taskids):
+        '''Collect specific tasks of a user with their subtasks, used to push single changes to the task panel
 
-        for i in range(len(result)):
-            taskid_list.append(result[i][0])
-        
-        if not taskid_list:
+        Input: int, list
+        Output: list'''
+        if not taskids:
             return []
+        with self._get_conn() as conn:
+            tasks = self._fetch_user_tasks(conn.cursor(), uuid, taskids=list(taskids))
+        self.task_cache.note_tasks(uuid, tasks)
+        return tasks
 
-        taskid_string = ',' .join(['?'] * len(taskid_list))
-        
-        user_task_list = []
-        
+    def query_user_task_page(self, uuid, after=None, limit=None):
+        '''Collect one page of user tasks in task panel order, after is the page_key() of the last task already shown.
+        The first page is read from the database only when the cached page was invalidated
+
+        Input: int, tuple, int
+        Output: list'''
+        limit = self.task_page_size if limit is None else limit
+        if after is None and limit == self.task_page_size:
+            return self.task_cache.get(uuid, lambda: self._load_user_tasks(uuid, limit=limit))
+
+        page = self._load_user_tasks(uuid, after, limit)
+        self.task_cache.note_tasks(uuid, page)
+        return page
+
+    def search_tasks(self, uuid, text, limit=50):
+        '''Collect a user's tasks where the name or one subtask name has a word starting with each typed word, best matches first
+
+        Input: int, str, int
+        Output: list'''
+        match = self._search_expression(text)
+        if not match:
+            return []
         with self._get_conn() as conn:
-            conn.row_factory = sqlite3.Row 
             cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM tasks WHERE taskid IN ({taskid_string})", taskid_list)
-            rows = cursor.fetchall()
-            
-        for row in rows:
-            row_data = dict(row) 
-            row_data['subtasks'] = None
-
-            if row_data['subdivisions'] != 0:
-                subtask_list = []
-                with self._get_conn() as conn:
-                    conn.row_factory = sqlite3.Row 
-                    cursor = conn.cursor()
-                    cursor.execute(f"SELECT * FROM subtasks WHERE parent_id = ?", (row_data['taskid'],))
-                    rows = cursor.fetchall()
-                        
-                for row in rows:
-                    subtask = dict(row) 
-                    subtask_list.append(subtask)
-                row_data['subtasks'] = subtask_list
-                subtask_list = []
-
-            user_task = UserTask(**row_data)
-            user_task_list.append(user_task)
-        
-        subtask_list = []
-
-        return user_task_list
-    
-    def update_task_grant_status(self, taskid):
-        '''Updates grant status in database
+            # bm25 scores lower for better matches, a task hit through several subtasks keeps its best one
+            cursor.execute(
+                '''WITH hits AS (
+                       SELECT rowid AS taskid, bm25(tasks_fts) AS score FROM tasks_fts WHERE tasks_fts MATCH ?
+                       UNION ALL
+                       SELECT s.parent_id, bm25(subtasks_fts) FROM subtasks_fts
+                       JOIN subtasks s ON s.subtask_id = subtasks_fts.rowid
+                       WHERE subtasks_fts MATCH ?
+                   )
+                   SELECT h.taskid FROM hits h
+                   JOIN tasks t ON t.taskid = h.taskid
+                   WHERE t.uuid = ?
+                   GROUP BY h.taskid
+                   ORDER BY MIN(h.score), h.taskid
+                   LIMIT ?''',
+                (match, match, uuid, limit)
+            )
+            ranked = [row[0] for row in cursor.fetchall()]
+            tasks = self._fetch_user_tasks(cursor, uuid, taskids=ranked) if ranked else []
+
+        order = {taskid: rank for rank, taskid in enumerate(ranked)}
+        tasks.sort(key=lambda task: order[task.taskid])
+        self.task_cache.note_tasks(uuid, tasks)
+        return tasks
+
+    def _search_expression(self, text):
+        '''Turns typed text into an FTS5 query matching every word as a prefix, quoting keeps the query syntax out of user input
 
-        Input: int
-        Output: None'''
+        Input: str
+        Output: str'''
+        return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text.lower()))
+
+    def query_tasks_due(self, uuid, start=None, end=None, limit=None):
+        '''Collect a user's unfinished tasks due from start up to end in epoch seconds, soonest first, read as a range of idx_tasks_due
+
+        Input: int, int, int, int
+        Output: list'''
         with self._get_conn() as conn:
-            conn.cursor().execute('UPDATE tasks SET grant_status = ? WHERE taskid = ?', (1, taskid))
-            conn.commit()
-    
-    def query_task_grant_status(self, taskid):
-        '''Collects grant status data from database
+            tasks = self._fetch_user_tasks(conn.cursor(), uuid, limit=limit, due_range=(start, end))
+        self.task_cache.note_tasks(uuid, tasks)
+        return tasks
 
-        Input: int
-        Output: tuple'''
+    def query_overdue_tasks(self, uuid, now=None):
+        '''Collect a user's unfinished tasks whose deadline has passed
+
+        Input: int, int
+        Output: list'''
+        return self.query_tasks_due(uuid, end=urgency_bounds(now)[0])
+
+    def query_tasks_due_within(self, uuid, hours, now=None):
+        '''Collect a user's unfinished tasks due in the next given hours
+
+        Input: int, float, int
+        Output: list'''
+        now = urgency_bounds(now)[0]
+        return self.query_tasks_due(uuid, now, now + int(hours * 3600))
+
+    def query_tasks_due_this_week(self, uuid, now=None):
+        '''Collect a user's unfinished tasks due from now until the end of the week
+
+        Input: int, int
+        Output: list'''
+        now, end_of_day, end_of_week = urgency_bounds(now)
+        return self.query_tasks_due(uuid, now, end_of_week)
+
+    def query_upcoming_deadlines(self, uuid, now=None):
+        '''Collect (taskid, due_at, name) of a user's unfinished tasks with a deadline still ahead, soonest first,
+        without their subtasks since the reminder scheduler only needs when and what
+
+        Input: int, int
+        Output: list'''
+        now = urgency_bounds(now)[0]
         with self._get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT grant_status, reward FROM tasks WHERE taskid = ?', (taskid,))
-            result = cursor.fetchone()
-        
-        return result
-    
-    def task_update_status(self, status, taskid):
-        '''Updates task status and if applicable, returns grant status and reward
+            cursor.execute(
+                f'''SELECT taskid, due_at, name FROM tasks
+                   WHERE uuid = ? AND status = 0 AND {TASK_DUE_KEY} > ? AND {TASK_DUE_KEY} < ?
+                   ORDER BY {TASK_DUE_KEY}''',
+                (uuid, now, NO_DEADLINE)
+            )
+            return cursor.fetchall()
+
+    def count_tasks_by_urgency(self, uuid, bounds=None):
+        '''Counts a user's tasks in each urgency group, keys are indexes into URGENCY_GROUPS. Open groups are counted
+        as ranges of idx_tasks_due under status 0, finished tasks come from a kept count so the user's history is not read
+
+        Input: int, tuple
+        Output: dict'''
+        now, end_of_day, end_of_week = urgency_bounds() if bounds is None else bounds
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'''SELECT (SELECT COUNT(*) FROM tasks WHERE uuid = ?1 AND status = 0 AND {TASK_DUE_KEY} < ?2),
+                           (SELECT COUNT(*) FROM tasks WHERE uuid = ?1 AND status = 0 AND {TASK_DUE_KEY} >= ?2 AND {TASK_DUE_KEY} < ?3),
+                           (SELECT COUNT(*) FROM tasks WHERE uuid = ?1 AND status = 0 AND {TASK_DUE_KEY} >= ?3 AND {TASK_DUE_KEY} < ?4),
+                           (SELECT COUNT(*) FROM tasks WHERE uuid = ?1 AND status = 0 AND {TASK_DUE_KEY} >= ?4 AND {TASK_DUE_KEY} < {NO_DEADLINE}),
+                           (SELECT COUNT(*) FROM tasks WHERE uuid = ?1 AND status = 0 AND {TASK_DUE_KEY} = {NO_DEADLINE})''',
+                (uuid, now, end_of_day, end_of_week)
+            )
+            counts = dict(enumerate(cursor.fetchone()))
+        counts[5] = self.count_done_tasks(uuid)
+        return counts
+
+    def count_done_tasks(self, uuid):
+        '''Returns how many of a user's tasks are finished, counted once and then moved by the writes that change a status
 
         Input: int
-        Output: int, int'''
+        Output: int'''
+        with self._done_lock:
+            if uuid in self.done_counts:
+                return self.done_counts[uuid]
         with self._get_conn() as conn:
-            conn.cursor().execute('UPDATE tasks SET status = ? WHERE taskid = ?', (status, taskid))
-            conn.commit()
-        
-        if status == 1:
-            grant_status, reward = self.query_task_grant_status(taskid)
+            done = conn.execute('SELECT COUNT(*) FROM tasks WHERE uuid = ? AND status > 0', (uuid,)).fetchone()[0]
+        with self._done_lock:
+            return self.done_counts.setdefault(uuid, done)
 
-            return grant_status, reward
+    def _shift_done(self, uuid, was_done, is_done):
+        '''Moves a kept finished count when a task's status crosses between open and finished
 
+        Input: int, bool, bool
+        Output: None'''
+        if bool(was_done) == bool(is_done):
+            return
+        with self._done_lock:
+            if uuid in self.done_counts:
+                self.done_counts[uuid] += 1 if is_done else -1
 
-    def subtask_update_status(self, status, subtask_id):
-        '''Updates individual subtask status
+    def _forget_done_counts(self):
+        '''Drops the kept finished counts after a rolled back write, they are counted again when next asked for
 
-        Input: int, int
+        Input: None
         Output: None'''
-        with self._get_conn() as conn:
-            conn.cursor().execute('UPDATE subtasks SET status = ? WHERE subtask_id = ?', (status, subtask_id))
-            conn.commit()
+        with self._done_lock:
+            self.done_counts.clear()
 
-    def query_divtask_status(self, taskid):
-        '''Updates divided tasks' subtask status and updates its own status accordingly, if applicable, returns grant status and reward
+    def cache_stats(self):
+        '''Returns hit and miss counters of the per-user task cache
 
-        Input: int
-        Output: int, int int'''
+        Input: None
+        Output: dict'''
+        return self.task_cache.stats()
+
+    def _load_user_tasks(self, uuid, after=None, limit=None):
+        '''Collect user tasks from database, subtasks come from the same joined query
+
+        Input: int, tuple, int
+        Output: list'''
         with self._get_conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT MIN(status) FROM subtasks WHERE parent_id = ?', (taskid,))
-            result = cursor.fetchone()
-        
-        grant_status, reward = self.query_task_grant_status(taskid)
-
-        if result[0] != 0:
-            self.task_update_status(1, taskid)
-            status = 1
-        else:
-            self.task_update_status(0, taskid)
-            status = 0
+            return self._fetch_user_tasks(conn.cursor(), uuid, after, limit)
 
-        if status == 1:
-            return result[0], grant_status, reward
-        else:
-            return result[0]
-        
+    def queue_task_status(self, status, taskid, on_done=None):
+        '''Queues a task status change, on_done receives the reward claimed by completing it or 0
+
+        Input: int, int, function
+        Output: None'''
+        def job(cursor):
+            cursor.execute('SELECT uuid, status FROM tasks WHERE taskid = ?', (taskid,))
+            row = cursor.fetchone()
+            cursor.execute('UPDATE tasks SET status = ? WHERE taskid = ?', (status, taskid))
+            if row is not None:
+                self._shift_done(row[0], row[1], status)
+            return self._claim_reward(cursor, taskid) if status == 1 else 0
+
+        self.task_cache.invalidate_task(taskid)
+        self._submit_write(('task_toggle', taskid), job, on_done, self._forget_done_counts)
+
+    def queue_subtask_status(self, status, subtask_id, taskid, on_done=None):
+        '''Queues a subtask status change that also settles its parent task, on_done receives the parent status and claimed reward
+
+        Input: int, int, int, function
+        Output: None'''
+        def job(cursor):
+            return self._toggle_subtask(cursor, status, subtask_id, taskid)
+
+        self.task_cache.invalidate_task(taskid)
+        self._submit_write(('subtask_toggle', subtask_id), job, on_done, self._forget_done_counts)
+
+    def _toggle_subtask(self, cursor, status, subtask_id, taskid):
+        '''Writes a subtask status, the triggers on subtasks move the parent's done counter so its status
+        is recomputed without reading the other subtasks
+
+        Input: object, int, int, int
+        Output: int, int'''
+        cursor.execute('SELECT uuid, status FROM tasks WHERE taskid = ?', (taskid,))
+        before = cursor.fetchone()
+        cursor.execute('UPDATE subtasks SET status = ? WHERE subtask_id = ?', (status, subtask_id))
+        cursor.execute(
+            'UPDATE tasks SET status = (subtasks_total > 0 AND subtasks_done = subtasks_total) WHERE taskid = ?',
+            (taskid,)
+        )
+        cursor.execute('SELECT status FROM tasks WHERE taskid = ?', (taskid,))
+        row = cursor.fetchone()
+        divtask_status = row[0] if row else 0
+        if before is not None:
+            self._shift_done(before[0], before[1], divtask_status)
+        reward = self._claim_reward(cursor, taskid) if divtask_status == 1 else 0
+        return divtask_status, reward
+
+    def _claim_reward(self, cursor, taskid):
+        '''Marks a completed task's reward as granted and credits it to the ledger in the same transaction,
+        returns the reward only the first time
+
+        Input: object, int
+        Output: int'''
+        # Tasks still waiting for a reward are left unclaimed, apply_enrichment claims them once priced
+        cursor.execute(
+            'UPDATE tasks SET grant_status = 1 WHERE taskid = ? AND status = 1 AND grant_status = 0 AND reward IS NOT NULL',
+            (taskid,)
+        )
+        if cursor.rowcount == 0:
+            return 0
+        cursor.execute('SELECT uuid, reward FROM tasks WHERE taskid = ?', (taskid,))
+        uuid, reward = cursor.fetchone()
+        if reward:
+            self._append_ledger(cursor, uuid, reward, 'reward', taskid)
+        return reward or 0
 
     def task_deletion(self, taskid):
-        '''Deletes task and its subtasks if task is divided
+        '''Deletes task, its subtasks are removed by the cascading foreign key
 
         Input: int
         Output: None'''
-        tempid = taskid
+        self.task_cache.invalidate_task(taskid)
         with self._get_conn() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT subdivisions FROM tasks WHERE taskid = ?', (tempid,))
-            result = cursor.fetchone()
-            conn.cursor().execute('DELETE FROM tasks WHERE taskid = ?', (tempid,))
+            cursor.execute('SELECT uuid, status FROM tasks WHERE taskid = ?', (taskid,))
+            row = cursor.fetchone()
+            cursor.execute('DELETE FROM tasks WHERE taskid = ?', (taskid,))
             conn.commit()
-        
-        if result[0] != 0:
-            with self._get_conn() as conn:
-                conn.cursor().execute('DELETE FROM subtasks WHERE parent_id = ?', (tempid,))
-                conn.commit()
\ No newline at end of file
+        if row is not None:
+            self._shift_done(row[0], row[1], 0)
\ No newline at end of file
@@ -0,0 +1,288 @@
+import csv
+import os
+import sqlite3
+from datetime import datetime, time, timezone
+from itertools import islice
+from PyQt6.QtCore import QThread, pyqtSignal
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+### Streaming task import, files are read a line at a time and written a batch at a time ###
+CSV_COLUMNS = {
+    'name': ('name', 'task', 'title', 'summary'),
+    'date': ('date_due', 'due_date', 'date', 'due'),
+    'time': ('time_due', 'due_time', 'time'),
+    'subtasks': ('subtasks', 'steps')
+}
+
+class ImportResult():
+    def __init__(self):
+        '''Counts of what happened to the rows of an imported file, the first few problems are kept for the user
+
+        Input: None
+        Output: None'''
+        self.read = 0
+        self.inserted = 0
+        self.invalid = 0
+        self.errors = []
+        self.cancelled = False
+
+    @property
+    def duplicates(self):
+        '''Valid rows skipped because the user already had the task
+
+        Input: None
+        Output: int'''
+        return self.read - self.invalid - self.inserted
+
+    def reject(self, line, reason, keep=20):
+        '''Counts a row that could not be imported
+
+        Input: int, str, int
+        Output: None'''
+        self.invalid += 1
+        if len(self.errors) < keep:
+            self.errors.append(f'line {line}: {reason}')
+
+class LineCounter():
+    def __init__(self, path):
+        '''Tracks how far through a file its lines have been read, for progress reporting
+
+        Input: str
+        Output: None'''
+        self.total = max(os.path.getsize(path), 1)
+        self.read = 0
+
+    def lines(self, file):
+        '''Yields the file's lines while counting their length
+
+        Input: object
+        Output: generator'''
+        for line in file:
+            self.read += len(line)
+            yield line
+
+    def fraction(self):
+        '''Returns the part of the file read so far
+
+        Input: None
+        Output: float'''
+        return min(self.read / self.total, 1.0)
+
+def parse_due(text):
+    '''Parses an ISO date with an optional time into a local datetime, None for an empty value
+
+    Input: str
+    Output: object'''
+    # fromisoformat parses in C, strptime costs more than the database insert on large files
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f'unreadable date {text!r}') from None
+
+def read_csv_tasks(lines):
+    '''Yields (line, name, due, subtasks) from CSV lines with a header row, column names are matched loosely
+
+    Input: iterable
+    Output: generator'''
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip().lower() for column in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        columns[field] = next((header.index(alias) for alias in aliases if alias in header), None)
+    if columns['name'] is None:
+        raise ValueError('the CSV header has no name, task or title column')
+
+    def cell(row, field):
+        index = columns[field]
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        line = reader.line_num
+        try:
+            date_text = cell(row, 'date')
+            due = parse_due(date_text)
+            time_text = cell(row, 'time')
+            if due is not None and time_text:
+                due = datetime.combine(due.date(), time.fromisoformat(time_text))
+            elif due is not None and len(date_text) <= 10:
+                # A bare date is due at the end of that day, as iCalendar dates and tasks without a time are
+                due = due.replace(hour=23, minute=59)
+        except ValueError as e:
+            yield line, cell(row, 'name'), e, []
+            continue
+        subtasks = [step.strip() for step in cell(row, 'subtasks').replace('|', ';').split(';') if step.strip()]
+        yield line, cell(row, 'name'), due, subtasks
+
+def unfold_ics(lines):
+    '''Yields (line number, logical line) from iCalendar lines, joining folded continuation lines
+
+    Input: iterable
+    Output: generator'''
+    current = None
+    start = 0
+    for number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+def parse_ics_time(value, params):
+    '''Turns an iCalendar DATE or DATE-TIME into a local datetime and whether it carried a time of day
+
+    Input: str, dict
+    Output: tuple'''
+    if len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d'), False
+    if value.endswith('Z'):
+        moment = datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        return moment.astimezone().replace(tzinfo=None), True
+    moment = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    tzid = params.get('TZID')
+    if tzid and ZoneInfo is not None:
+        try:
+            moment = moment.replace(tzinfo=ZoneInfo(tzid)).astimezone().replace(tzinfo=None)
+        except (KeyError, ValueError):
+            pass
+    return moment, True
+
+def read_ics_tasks(lines):
+    '''Yields (line, name, due, subtasks) for every open VTODO and every VEVENT, events are due when they start
+
+    Input: iterable
+    Output: generator'''
+    component = None
+    for line, text in unfold_ics(lines):
+        key, _, value = text.partition(':')
+        name, *param_list = key.split(';')
+        name = name.upper()
+        if name == 'BEGIN' and value.upper() in ('VTODO', 'VEVENT'):
+            component = {'line': line, 'kind': value.upper()}
+        elif component is None:
+            continue
+        elif name == 'END' and value.upper() == component['kind']:
+            if component.get('STATUS') not in ('COMPLETED', 'CANCELLED'):
+                due = component.get('DUE') if component['kind'] == 'VTODO' else component.get('DTSTART')
+                yield component['line'], component.get('SUMMARY', ''), due, []
+            component = None
+        elif name == 'SUMMARY':
+            component['SUMMARY'] = value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+        elif name == 'STATUS':
+            component['STATUS'] = value.strip().upper()
+        elif name in ('DUE', 'DTSTART'):
+            params = dict(param.split('=', 1) for param in param_list if '=' in param)
+            try:
+                moment, timed = parse_ics_time(value.strip(), params)
+                component[name] = moment if timed else moment.replace(hour=23, minute=59)
+            except ValueError as e:
+                component[name] = e
+
+def validate_tasks(records, uuid, result, max_name=200):
+    '''Yields insert rows (uuid, name, deadline, date_due, time_due, subtasks) for records that make a task,
+    counting every record read and rejecting the rest on result
+
+    Input: iterable, int, object, int
+    Output: generator'''
+    for line, name, due, subtasks in records:
+        result.read += 1
+        name = ' '.join(name.split())
+        if isinstance(due, Exception):
+            result.reject(line, str(due))
+        elif not name:
+            result.reject(line, 'missing task name')
+        elif len(name) > max_name:
+            result.reject(line, f'task name longer than {max_name} characters')
+        elif due is None:
+            yield (uuid, name, 0, None, None, tuple(subtasks))
+        else:
+            yield (uuid, name, 1, due.strftime('%Y-%m-%d'), due.strftime('%H:%M'), tuple(subtasks))
+
+def batched(rows, size):
+    '''Yields lists of up to size rows
+
+    Input: iterable, int
+    Output: generator'''
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+class TaskImporter():
+    def __init__(self, handler, batch_size=2000, cache_kib=65536):
+        '''Imports CSV and iCalendar task files through a task handler without calling the AI model,
+        rewards are left for the handler to price later
+
+        Input: object, int, int
+        Output: None'''
+        self.handler = handler
+        self.batch_size = batch_size
+        self.cache_kib = cache_kib
+
+    def records(self, path, lines):
+        '''Picks the parser from the file extension
+
+        Input: str, iterable
+        Output: generator'''
+        if path.lower().endswith(('.ics', '.ical', '.ifb')):
+            return read_ics_tasks(lines)
+        return read_csv_tasks(lines)
+
+    def run(self, path, uuid, progress=None, should_stop=None):
+        '''Streams a file into the user's tasks one transaction per batch, progress gets the rows read and the part of the file done
+
+        Input: str, int, function, function
+        Output: object'''
+        result = ImportResult()
+        counter = LineCounter(path)
+        # With the default cache the full-text index pages fall out between batches and imports slow down as they grow
+        self.handler.reserve_cache(self.cache_kib)
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            rows = validate_tasks(self.records(path, counter.lines(file)), uuid, result)
+            for batch in batched(rows, self.batch_size):
+                result.inserted += self.handler.insert_task_rows(batch)
+                if progress is not None:
+                    progress(result.read, counter.fraction())
+                if should_stop is not None and should_stop():
+                    result.cancelled = True
+                    break
+        return result
+
+class ImportWorker(QThread):
+    '''Runs a task import off the GUI thread'''
+    progress = pyqtSignal(int, float)
+    import_finished = pyqtSignal(object)
+    import_failed = pyqtSignal(str)
+
+    def __init__(self, importer, path, uuid, parent=None):
+        super().__init__(parent)
+        self.importer = importer
+        self.path = path
+        self.uuid = uuid
+
+    def run(self):
+        try:
+            result = self.importer.run(self.path, self.uuid, self.progress.emit, self.isInterruptionRequested)
+        except (OSError, UnicodeDecodeError, ValueError, csv.Error, sqlite3.Error) as e:
+            self.import_failed.emit(str(e))
+        else:
+            self.import_finished.emit(result)
+        finally:
+            self.importer.handler.release_connection()
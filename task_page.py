@@ -2,15 +2,15 @@ import sys
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, 
                              QPushButton, QCheckBox, QSlider, QLabel, 
                              QCalendarWidget, QTimeEdit, QStackedWidget, 
-                             QApplication, QMainWindow, QSizePolicy, QDialog)
+                             QApplication, QMainWindow, QSizePolicy, QDialog,
+                             QFileDialog)
 from PyQt6.QtCore import Qt, QDate, QTime, pyqtSignal, QSize, QPropertyAnimation, QPoint
 from PyQt6.QtGui import QTextCharFormat, QColor, QFont, QIcon
-from task_handler import ai_engine
 
 # DATA STRUCTURE SECTION
 class TaskSpecifications():
     def __init__(self, name, date_due, time_due, deadline, subdivisions=0, uuid=1):
-        '''Initializes the task data container with AI difficulty scaling
+        '''Initializes the task data container as a draft, reward and subtasks stay pending for the enrichment worker
 
         Input: str, str, str, int, int, int
         Output: None'''
@@ -21,18 +21,15 @@ class TaskSpecifications():
         self.date_due = date_due
         self.time_due = time_due
 
-        difficulty = ai_engine.get_task_diff(self.name)
-        self.reward = difficulty*10
-
+        self.reward = None
         self.subtasks = 0
-        if self.subdivisions:
-            self.subtasks = ai_engine.get_subtask_list(self.name, self.subdivisions)
 
 # MAIN WIDGET INITIALIZATION SECTION
 class TaskEntryWidget(QWidget):
     #Signal
     request_main_page = pyqtSignal()
     task_ready_signal = pyqtSignal(object)
+    import_file_signal = pyqtSignal(str)
 
     def __init__(self, styles, parent=None):
         '''Sets up the task entry widget and initializes the view
@@ -113,11 +110,23 @@ class TaskEntryWidget(QWidget):
         self.btn_add_task.setStyleSheet(self.styles.action_button_style())
         self.btn_add_task.clicked.connect(self.fnc_emit_task_data)
 
+        # bulk import from a CSV or iCalendar file
+        self.btn_import_tasks = QPushButton('⇪')
+        self.btn_import_tasks.setFixedSize(40, 40)
+        self.btn_import_tasks.setToolTip('Import tasks from a CSV or iCalendar file')
+        self.btn_import_tasks.clicked.connect(self.fnc_choose_import_file)
+
         top_nav_bar.addWidget(self.btn_return_home)
         top_nav_bar.addWidget(self.task_description_input)
         top_nav_bar.addWidget(self.btn_add_task)
+        top_nav_bar.addWidget(self.btn_import_tasks)
         page_layout.addLayout(top_nav_bar)
 
+        # AI model status, the model warms up in the background after startup
+        self.lbl_model_status = QLabel('AI model loading...')
+        self.lbl_model_status.setStyleSheet(f"color: {self.styles.col_text}; font-size: 11px;")
+        page_layout.addWidget(self.lbl_model_status)
+
         # Split Task Controls
         self.chk_enable_split = QCheckBox('Split Task')
         self.chk_enable_split.setStyleSheet(f"color: {self.styles.col_text}; font-weight: bold;")
@@ -315,10 +324,27 @@ class TaskEntryWidget(QWidget):
             time_val = self.time_selector_widget.time().toString('HH:mm')
 
         #object stuff
+        # The task is saved right away, its reward and steps come from the enrichment worker off the GUI thread
         new_task = TaskSpecifications(desc, date_val, time_val, deadline, subdivisions=split_val, uuid=self.current_uuid)
         self.task_ready_signal.emit(new_task)
         self.fnc_reset_ui_inputs()
 
+    def set_model_status(self, ready):
+        '''Shows whether the AI model finished loading, tasks added before then wait for it
+
+        Input: bool
+        Output: None'''
+        self.lbl_model_status.setText('AI model ready' if ready else 'AI model unavailable')
+
+    def fnc_choose_import_file(self):
+        '''Asks for a task file and emits its path for importing
+
+        Input: None
+        Output: None'''
+        path, _ = QFileDialog.getOpenFileName(self, 'Import Tasks', '', 'Task files (*.csv *.ics);;All files (*)')
+        if path:
+            self.import_file_signal.emit(path)
+
     #Reset UI and Reset values after clicking +
     def fnc_reset_ui_inputs(self):
         '''Clears all input bars and resets toggles to default states